@@ -0,0 +1,190 @@
+""" Benchmark suite for physics, collision, lasers, measurements and rendering on synthetic maps
+
+Run "python benchmark.py --output results.json" to time all subsystems headless. Compare with a stored baseline by
+"python benchmark.py --baseline baseline.json", slowdowns beyond the tolerance are flagged and give exit code 1.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# Rendering benchmarks draw on SDL dummy video driver, so no display is needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+from environment import Environment  # noqa: E402
+from obstacles import Obstacles  # noqa: E402
+from drone import Drone, Laser  # noqa: E402
+from sensors import simulate_lidar  # noqa: E402
+from swarm import DroneSwarm  # noqa: E402
+
+# Benchmark settings
+SEGMENT_COUNTS = [10, 100, 1000, 10000]  # Number of obstacle segments of synthetic maps
+LASER_COUNTS = [4, 64, 256]  # Number of lasers
+LIDAR_BEAMS = 1024  # Number of beams of one full LiDAR scan
+DRONE_COUNTS = [1, 100, 1000, 10000]  # Number of drones in swarm
+MIN_TIME = 0.2  # Minimum time to run each benchmark [s]
+TOLERANCE = 1.25  # Maximum ratio to baseline before result is flagged as slowdown
+
+
+def synthetic_map(n_segments, width, height, spawn, clearance=0.5, seed=0):
+    """
+    Random short walls spread over the playground, none of them closer than clearance to spawn
+
+    :param n_segments: number of segments
+    :param width: width of map [m]
+    :param height: height of map [m]
+    :param spawn: spawn position [x, y] in [m] to keep free
+    :param clearance: radius around spawn without walls [m]
+    :param seed: random seed
+    :return: list of np.ndarrays (dim=2) containing coordinates of lines
+    """
+    rng = np.random.default_rng(seed)
+    start = rng.uniform([0, 0], [width, height], size=(4 * n_segments, 2))
+    angle = rng.uniform(0, 2 * np.pi, size=4 * n_segments)
+    length = rng.uniform(0.1, 0.5, size=4 * n_segments)
+    end = np.clip(start + length[:, None] * np.column_stack([np.cos(angle), np.sin(angle)]), 0, [width, height])
+    # Keep segments with both endpoints and their middle far enough from spawn
+    keep = np.ones(len(start), dtype=bool)
+    for point in (start, end, (start + end) / 2):
+        keep &= np.linalg.norm(point - spawn, axis=1) > clearance + 0.25
+    start, end = start[keep][:n_segments], end[keep][:n_segments]
+    return [np.array([p1, p2]) for p1, p2 in zip(start, end)]
+
+
+def measure(func, min_time=MIN_TIME):
+    """
+    Call function repeatedly for at least min_time
+
+    :return: mean time per call [us]
+    """
+    func()  # Warm up caches
+    n_calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        n_calls += 1
+        duration = time.perf_counter() - start
+        if duration >= min_time:
+            return duration / n_calls * 1e6
+
+
+def create_world(n_segments):
+    env = Environment()
+    env.update()
+    env.dt = 1 / 60
+    obstacles = Obstacles(env)
+    drone = Drone(env)
+    walls = synthetic_map(n_segments, env.PLAYGROUND_WIDTH / env.m_to_pxl, env.SCREEN_HEIGHT / env.m_to_pxl,
+                          drone.pos)
+    for coords in walls:
+        obstacles.add_obstacle(coords)
+    return env, obstacles, drone
+
+
+def run_benchmarks(segment_counts, laser_counts, drone_counts, min_time):
+    """
+    :return: list of result dicts with name, params and us_per_call
+    """
+    results = []
+
+    def add(name, params, func):
+        us = measure(func, min_time)
+        results.append({'name': name, 'params': params, 'us_per_call': us})
+        print("{:<28} {:<52} {:>12.1f} us".format(name, json.dumps(params), us))
+
+    for n_segments in segment_counts:
+        env, obstacles, drone = create_world(n_segments)
+        params = {'segments': n_segments}
+        for n_laser in laser_counts:
+            add('simulate_laser_meas', dict(params, lasers=n_laser, grid=False),
+                lambda: drone.simulate_laser_meas(n_laser, drone.laser_max_range, obstacles.all_obstacles))
+            add('simulate_laser_meas', dict(params, lasers=n_laser, grid=True),
+                lambda: drone.simulate_laser_meas(n_laser, drone.laser_max_range, obstacles.all_obstacles,
+                                                  obstacles.segment_grid))
+        lidar_angles = drone.psi + np.arange(LIDAR_BEAMS) * (2 * np.pi / LIDAR_BEAMS)
+        add('simulate_lidar', dict(params, beams=LIDAR_BEAMS, grid=True),
+            lambda: simulate_lidar(drone.pos, lidar_angles, drone.laser_max_range, obstacles.all_obstacles,
+                                   obstacles.segment_grid))
+        add('check_collision', dict(params, grid=True),
+            lambda: drone.check_collision(obstacles.all_obstacles, obstacles.segment_grid))
+
+        # Rendering
+        add('draw_environment', params, env.draw_environment)
+
+        def draw_obstacles_uncached():
+            obstacles.obstacle_layer = None
+            obstacles.draw_all_obstacles()
+        add('draw_all_obstacles', dict(params, cached=True), obstacles.draw_all_obstacles)
+        add('draw_all_obstacles', dict(params, cached=False), draw_obstacles_uncached)
+        drone.check_collision(obstacles.all_obstacles, obstacles.segment_grid)
+        add('update_draw', params, drone.update_draw)
+
+    # Physics
+    env, obstacles, drone = create_world(0)
+    drone.apply_forces([0.5, 0.5], 0.1)
+    add('equation_of_motion', {'drones': 1}, lambda: (drone.calculate_forces(), drone.equation_of_motion()))
+    for n_drones in drone_counts:
+        swarm = DroneSwarm(env, n_drones)
+        swarm.apply_forces(np.full((n_drones, 2), 0.5), np.full(n_drones, 0.1))
+        add('swarm.update_physics', {'drones': n_drones}, swarm.update_physics)
+
+    # Measurements
+    for n_laser in laser_counts:
+        laser = Laser(drone, log_rate=1.0, N_meas=500, n_laser=n_laser, max_range=drone.laser_max_range,
+                      noise_perc=0.05)
+        sample = np.zeros(n_laser + 1)
+        add('MeasurementUnit.add_meas', {'lasers': n_laser}, lambda: laser.add_meas(sample))
+
+    return results
+
+
+def result_key(result):
+    return result['name'] + json.dumps(result['params'], sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: list of (result, baseline result, ratio) for all results slower than tolerance times baseline
+    """
+    baseline_by_key = {result_key(result): result for result in baseline['results']}
+    slowdowns = []
+    for result in results:
+        reference = baseline_by_key.get(result_key(result))
+        if reference is None:
+            continue
+        ratio = result['us_per_call'] / reference['us_per_call']
+        if ratio > tolerance:
+            slowdowns.append((result, reference, ratio))
+    return slowdowns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite of 2D Drone Simulation")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare results with JSON file written before with --output")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed ratio to baseline")
+    parser.add_argument("--quick", action="store_true", help="smaller sweep and shorter runs")
+    args = parser.parse_args()
+
+    if args.quick:
+        all_results = run_benchmarks(SEGMENT_COUNTS[:3], LASER_COUNTS[:2], DRONE_COUNTS[:3], MIN_TIME / 4)
+    else:
+        all_results = run_benchmarks(SEGMENT_COUNTS, LASER_COUNTS, DRONE_COUNTS, MIN_TIME)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'numpy': np.__version__, 'results': all_results}, f,
+                      indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            all_slowdowns = compare(all_results, json.load(f), args.tolerance)
+        for result, reference, ratio in all_slowdowns:
+            print("SLOWDOWN {} {}: {:.1f} us -> {:.1f} us ({:.2f}x)".format(
+                result['name'], json.dumps(result['params']), reference['us_per_call'], result['us_per_call'], ratio))
+        if all_slowdowns:
+            sys.exit(1)
+        print("No slowdown compared to baseline")
@@ -0,0 +1,310 @@
+""" File to connect controllers running in other processes with the drone over a local socket
+
+Message format (all little endian), every message is HEADER (message type, payload length, sequence number) followed
+by the payload:
+    STATE (simulation -> controller): STATE (simulated flight time of drone [s] (restarts at 0 after a crash), x, y [m],
+        psi [rad], speed_nav x, y [m/s], yaw rate [rad/s], AccX, AccY [m/s^2], OmegaZ [rad/s^2] of latest IMU
+        measurement (with its noise, updated at its log rate), number of lasers n) followed by n float32 laser ranges [m]
+        (nan without hit)
+    States are only sent while the drone is flying and the game is not paused.
+    COMMAND (controller -> simulation): COMMAND (sequence number of answered state, F_xb, F_yb [N], M [Nm])
+Usage: start the game with "python main.py --bridge", then run a controller in another process, e.g. the example
+controller with "python bridge.py".
+"""
+
+import argparse
+import asyncio
+import os
+import struct
+import threading
+import time
+import numpy as np
+from profiler import StageTimer
+
+HEADER = struct.Struct('<BHI')
+STATE = struct.Struct('<10dH')
+COMMAND = struct.Struct('<I3d')
+MSG_STATE = 1
+MSG_COMMAND = 2
+
+# Bridge settings
+BRIDGE_ADDRESS = "127.0.0.1:5555"  # TCP "host:port" or "unix:PATH" for a Unix socket | Default: "127.0.0.1:5555"
+PUBLISH_RATE = 60  # States sent per simulated second, at most one per frame [Hz] | Default: 60
+MAX_BUFFERED = 64 * 1024  # Bytes waiting to be sent to one controller, further states are dropped [B] | Default: 64 kB
+LATENCY_WINDOW = 300  # Number of recent round trips used for latency statistics | Default: 300
+
+
+def parse_address(address):
+    """
+    :param address: "host:port" or "unix:PATH"
+    :return: tuple ("unix", path) or ("tcp", host, port)
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, port = address.rsplit(":", 1)
+    return "tcp", host, int(port)
+
+
+def encode_state(seq, t, drone):
+    """
+    :param seq: sequence number of message
+    :param t: simulated flight time [s]
+    :param drone: drone to send state of
+    :return: bytes of complete STATE message
+    """
+    laser = np.asarray(drone.get_sim_laser_meas(), dtype='<f4')
+    imu = drone.IMU.get_current_meas()  # [timestamp, AccX, AccY, OmegaZ]
+    payload = STATE.pack(t, drone.pos[0], drone.pos[1], drone.psi, drone.speed_nav[0], drone.speed_nav[1], drone.r,
+                         imu[1], imu[2], imu[3], len(laser)) + laser.tobytes()
+    return HEADER.pack(MSG_STATE, len(payload), seq) + payload
+
+
+def decode_state(payload):
+    """
+    :param payload: payload bytes of STATE message
+    :return: dict with t, pos, psi, speed_nav, r, imu ([AccX, AccY, OmegaZ]) and laser
+    """
+    values = STATE.unpack_from(payload)
+    return {'t': values[0],
+            'pos': np.array(values[1:3]),
+            'psi': values[3],
+            'speed_nav': np.array(values[4:6]),
+            'r': values[6],
+            'imu': np.array(values[7:10]),
+            'laser': np.frombuffer(payload, dtype='<f4', count=values[10], offset=STATE.size).astype(float)}
+
+
+def encode_command(seq, ack_seq, F, M):
+    """
+    :param seq: sequence number of message
+    :param ack_seq: sequence number of state the command answers, used to measure latency
+    :param F: Translational Force as 2-dim array in body frame [N]
+    :param M: Rotational Force [Nm]
+    :return: bytes of complete COMMAND message
+    """
+    return HEADER.pack(MSG_COMMAND, COMMAND.size, seq) + COMMAND.pack(ack_seq, F[0], F[1], M)
+
+
+async def read_message(reader):
+    """
+    :param reader: asyncio.StreamReader
+    :return: tuple (message type, sequence number, payload bytes)
+    """
+    msg_type, length, seq = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return msg_type, seq, await reader.readexactly(length)
+
+
+class ControllerBridge:
+    def __init__(self, drone, address=BRIDGE_ADDRESS, rate=PUBLISH_RATE):
+        """
+        Socket server running an asyncio event loop in a background thread, so slow controllers never stall the game.
+        The main loop calls publish() and apply_commands() once per frame, both return immediately.
+
+        :param drone: drone to publish state of and to apply received commands to
+        :param address: "host:port" for TCP or "unix:PATH" for a Unix socket
+        :param rate: states sent per simulated second [Hz]
+        """
+        self.drone = drone
+        self.address = address
+        self.publish_period = 1 / rate
+        self.last_publish = -np.inf  # Flight time of last published state [s]
+        self.seq = 0  # Sequence number of last sent state
+        # Send time of recent states to measure round trip time, indexed by sequence number modulo length
+        self.sent_seq = np.full(4 * LATENCY_WINDOW, -1, dtype=np.int64)
+        self.sent_time = np.zeros(4 * LATENCY_WINDOW)
+        self.latency = StageTimer(LATENCY_WINDOW)  # Time from sending state until command is applied [s]
+        # Counters
+        self.n_sent = 0
+        self.n_dropped_sent = 0  # States not sent, because controller did not read previous ones
+        self.n_received = 0
+        self.n_dropped_received = 0  # Commands replaced by a newer command before being applied
+        self.n_invalid = 0  # Messages of unknown type
+
+        self.writers = set()  # Connected controllers, only used in event loop thread
+        self.command = None  # Latest received (ack_seq, F, M), handed over under lock
+        self.lock = threading.Lock()
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    @property
+    def n_clients(self):
+        return len(self.writers)
+
+    def start(self):
+        """
+        Start event loop thread and listen for controllers, errors like an occupied port are raised here
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="ControllerBridge", daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._serve(), self.loop).result()
+
+    async def _serve(self):
+        address = parse_address(self.address)
+        if address[0] == "unix":
+            self.server = await asyncio.start_unix_server(self._handle_client, path=address[1])
+        else:
+            self.server = await asyncio.start_server(self._handle_client, host=address[1], port=address[2])
+
+    async def _handle_client(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            while True:
+                msg_type, _, payload = await read_message(reader)
+                if msg_type != MSG_COMMAND or len(payload) != COMMAND.size:
+                    self.n_invalid += 1
+                    continue
+                ack_seq, F_x, F_y, M = COMMAND.unpack(payload)
+                with self.lock:
+                    if self.command is not None:
+                        self.n_dropped_received += 1
+                    self.command = (ack_seq, (F_x, F_y), M)
+                    self.n_received += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def publish(self, t):
+        """
+        Send current drone state to all controllers, if publish period has passed since last state. Call only while
+        the physics is running.
+
+        :param t: simulated flight time of drone [s], e.g. drone.IMU.timestamp
+        """
+        # Time restarts after a crash reset the drone
+        if t < self.last_publish:
+            self.last_publish = -np.inf
+        # Tolerance, since the simulation time is a sum of many time steps with round-off
+        if t - self.last_publish < self.publish_period - 1e-6 or not self.writers:
+            return
+        # Publish on the grid of periods, so frames not matching the rate give the right mean rate. After a pause
+        # (e.g. no controller) the grid restarts with at most one state to catch up.
+        if np.isinf(self.last_publish):
+            self.last_publish = t
+        else:
+            self.last_publish = max(self.last_publish + self.publish_period, t - self.publish_period)
+        self.seq += 1
+        message = encode_state(self.seq, t, self.drone)
+        slot = self.seq % len(self.sent_seq)
+        self.sent_seq[slot] = self.seq
+        self.sent_time[slot] = time.perf_counter()
+        self.loop.call_soon_threadsafe(self._broadcast, message)
+
+    def _broadcast(self, message):
+        for writer in list(self.writers):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                self.n_dropped_sent += 1
+            else:
+                writer.write(message)
+                self.n_sent += 1
+
+    def apply_commands(self):
+        """
+        Apply latest received command with Drone.apply_forces, if there is a new one
+        """
+        with self.lock:
+            command, self.command = self.command, None
+        if command is None:
+            return
+        ack_seq, F, M = command
+        self.drone.apply_forces(F, M)
+        slot = ack_seq % len(self.sent_seq)
+        if self.sent_seq[slot] == ack_seq:
+            self.latency.add(time.perf_counter() - self.sent_time[slot])
+
+    def stats(self):
+        """
+        :return: dict with latency statistics in [ms] (see StageTimer.stats) and all counters
+        """
+        return {'clients': self.n_clients,
+                'latency': self.latency.stats(),
+                'sent': self.n_sent,
+                'dropped_sent': self.n_dropped_sent,
+                'received': self.n_received,
+                'dropped_received': self.n_dropped_received,
+                'invalid': self.n_invalid}
+
+    def draw_info(self, env):
+        """
+        Show connection, latency and dropped messages at bottom of playground
+
+        :param env: environment to draw on
+        """
+        stats = self.stats()
+        env.display_text("Bridge: {} controller(s), latency {:.1f} / {:.1f} ms, dropped {} sent / {} received".format(
+            stats['clients'], stats['latency']['mean'], stats['latency']['p95'], stats['dropped_sent'],
+            stats['dropped_received']), (env.PLAYGROUND_WIDTH / 2, env.SCREEN_HEIGHT - 20), 14)
+
+    def close(self):
+        """
+        Disconnect all controllers and stop event loop thread
+        """
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            self.server.close()
+            for writer in list(self.writers):
+                writer.close()
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        address = parse_address(self.address)
+        if address[0] == "unix" and os.path.exists(address[1]):
+            os.remove(address[1])
+
+
+async def run_controller(controller, address=BRIDGE_ADDRESS):
+    """
+    Connect to a running game and answer every state with a command until the game ends
+
+    :param controller: callable(state) returning (F, M), state is a dict (see decode_state)
+    :param address: "host:port" for TCP or "unix:PATH" for a Unix socket
+    """
+    address = parse_address(address)
+    if address[0] == "unix":
+        reader, writer = await asyncio.open_unix_connection(address[1])
+    else:
+        reader, writer = await asyncio.open_connection(address[1], address[2])
+    seq = 0
+    try:
+        while True:
+            msg_type, state_seq, payload = await read_message(reader)
+            if msg_type != MSG_STATE:
+                continue
+            F, M = controller(decode_state(payload))
+            seq += 1
+            writer.write(encode_command(seq, state_seq, F, M))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def remote_hover_forward(state):
+    """
+    Example controller for run_controller, it receives the decoded STATE message instead of a Drone (in-process
+    controllers like rollout.hover_forward get the Drone itself): fly forward and brake, if the front laser measures an
+    obstacle closer than 1 m
+
+    :param state: dict, see decode_state
+    :return: tuple (F, M)
+    """
+    front = state['laser'][0]
+    if not np.isnan(front) and front < 1.0:
+        return [0, -0.5], 0
+    return [0, 0.5], 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Example controller connecting to game started with --bridge")
+    parser.add_argument("--address", default=BRIDGE_ADDRESS, help="host:port or unix:PATH")
+    args = parser.parse_args()
+    asyncio.run(run_controller(remote_hover_forward, args.address))
@@ -0,0 +1,126 @@
+""" Class to handle the part of the world shown in the playground"""
+
+import pygame
+import numpy as np
+
+# Camera settings
+MIN_ZOOM = 0.05  # Smallest zoom factor (zoomed out) | Default: 0.05
+MAX_ZOOM = 8.0  # Largest zoom factor (zoomed in) | Default: 8.0
+ZOOM_STEP = 1.25  # Zoom factor per mouse wheel step | Default: 1.25
+
+
+class Camera:
+    def __init__(self, environment):
+        """
+        Viewport on the world in meters, the playground shows the world around the camera center with given zoom.
+        With zoom 1 one meter is drawn with METER_TO_PIXEL pixels.
+
+        :param environment: environment the camera draws on
+        """
+        self.env = environment
+        self.zoom = 1.0
+        self.following = True  # Camera center follows the drone
+        self.dragging = False  # Camera is moved with middle mouse button
+        # World boundaries [x_min, y_min, x_max, y_max] in [m], by default exactly the playground
+        self.world_bounds = np.array([0.0, 0.0, self.env.PLAYGROUND_WIDTH / self.env.m_to_pxl,
+                                      self.env.SCREEN_HEIGHT / self.env.m_to_pxl])
+        self.center = (self.world_bounds[0:2] + self.world_bounds[2:4]) / 2  # [m]
+        self.origin = np.zeros(2)  # World coordinates of lower left playground corner [m]
+        # Transformation into pygame coordinates: pixel = coord * pixel_scale + pixel_offset
+        self.pixel_scale = np.zeros(2)
+        self.pixel_offset = np.zeros(2)
+        self.version = 0  # Incremented with every change of view, so cached drawings can detect changes
+        self.update_origin()
+
+    @property
+    def scale(self):
+        """
+        :return: pixels per meter
+        """
+        return self.env.m_to_pxl * self.zoom
+
+    def view_size(self):
+        """
+        :return: width and height of visible world [m]
+        """
+        return np.array([self.env.PLAYGROUND_WIDTH, self.env.SCREEN_HEIGHT]) / self.scale
+
+    def visible_rect(self):
+        """
+        :return: visible part of world [x_min, y_min, x_max, y_max] in [m]
+        """
+        return np.concatenate([self.origin, self.origin + self.view_size()])
+
+    def set_world_bounds(self, bounds):
+        """
+        :param bounds: [x_min, y_min, x_max, y_max] in [m]
+        """
+        self.world_bounds = np.array(bounds, dtype=float)
+        self.update_origin()
+
+    def follow(self, pos):
+        """
+        Center view on position, if camera is following, call once per frame before drawing
+
+        :param pos: position [x, y] in [m]
+        """
+        if self.following:
+            self.center = np.array(pos, dtype=float)
+            self.update_origin()
+
+    def move(self, delta):
+        """
+        :param delta: shift of camera center [m]
+        """
+        self.center = self.center + delta
+        self.update_origin()
+
+    def zoom_at(self, factor, screen_pos):
+        """
+        Zoom by factor, the world point below screen_pos stays where it is
+
+        :param factor: zoom factor, > 1 zooms in
+        :param screen_pos: pygame coordinates of fixed point
+        """
+        fixed = self.env.pygame_to_mysys(screen_pos)
+        new_zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        self.center = fixed + (self.center - fixed) * self.zoom / new_zoom
+        self.zoom = new_zoom
+        self.update_origin()
+
+    def update_origin(self):
+        """
+        Keep view inside world boundaries (a world smaller than the view is centered), update lower left corner and
+        transformation into pygame coordinates
+        """
+        half = self.view_size() / 2
+        low = self.world_bounds[0:2] + half
+        high = self.world_bounds[2:4] - half
+        self.center = np.where(low <= high, np.clip(self.center, low, high), (low + high) / 2)
+        origin = self.center - half
+        if not np.array_equal(origin, self.origin) or self.pixel_scale[0] != self.scale:
+            self.origin = origin
+            # Origin of pygame is top left and y axis points down
+            self.pixel_scale = np.array([self.scale, -self.scale])
+            self.pixel_offset = np.array([-origin[0] * self.scale, self.env.SCREEN_HEIGHT + origin[1] * self.scale])
+            self.version += 1
+
+    def check_user_input(self, event):
+        """
+        Mouse wheel: zoom, middle mouse button: drag view (stops following), F: follow drone again
+
+        :param event: pygame input event
+        """
+        MIDDLE = 2
+        mouse_pos = pygame.mouse.get_pos()
+        if event.type == pygame.MOUSEWHEEL and self.env.is_over_playground(mouse_pos):
+            self.zoom_at(ZOOM_STEP ** event.y, mouse_pos)
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == MIDDLE and self.env.is_over_playground(mouse_pos):
+            self.dragging = True
+            self.following = False
+        if event.type == pygame.MOUSEBUTTONUP and event.button == MIDDLE:
+            self.dragging = False
+        if event.type == pygame.MOUSEMOTION and self.dragging:
+            self.move(np.array([-event.rel[0], event.rel[1]]) / self.scale)
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_f:
+            self.following = True
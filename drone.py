@@ -2,9 +2,10 @@
 
 import pygame
 import numpy as np
-from tools.circle_line_intersection import circle_line_intersection
-from tools.line_intersect import line_intersection, distance
-import random
+from tools.swept_collision import swept_circle_segments
+from tools.ray_cast import polylines_to_segments
+from noise import NoiseModel
+from sensors import simulate_lasers, simulate_lidar, LaserWorker
 
 # Drone Settings
 RADIUS = 0.15  # [m] | Default: 0.15
@@ -16,14 +17,24 @@ M_USER_MAX = 0.25  # [Nm] | Default: 0.25
 
 NUMBER_LASER = 4  # Number of laser from drone | Default: 4
 LASER_RANGE_MAX = 3  # Maximum range of lasers in [m] | Default: 3
+LIDAR_BEAMS = 0  # Number of beams of additional LiDAR measurement unit, 0 for no LiDAR | Default: 0
+
+ROTATION_QUANTUM = 1  # Angular resolution of cached rotated drone images [deg] | Default: 1
+LASER_THREAD = False  # Simulate drawn lasers on worker thread (shown one frame late, never waited for) | Default: False
 
 # If you want to change initial position, see in Drone init function
 
 
 class Drone:
-    def __init__(self, environment):
+    def __init__(self, environment, seed=None):
+        """
+        :param environment: environment the drone lives in
+        :param seed: seed for noise of all measurement units, same seed gives same measurements
+        """
         # Make environment accessible
         self.env = environment
+        # Independent random streams for all measurement units are spawned from this
+        self.seed_sequence = np.random.SeedSequence(seed)
 
         # --------- Settings ---------
         self.radius = RADIUS  # [m]
@@ -35,6 +46,7 @@ class Drone:
 
         self.n_laser = NUMBER_LASER  # Number of laser range measurements used
         self.laser_max_range = LASER_RANGE_MAX  # Maximum range of lasers in [m]
+        self.rotation_quantum = ROTATION_QUANTUM  # Angular resolution of drawn drone image [deg]
 
         # Initial position, change if wanted
         self.x0 = (self.env.PLAYGROUND_WIDTH / 2) / self.env.m_to_pxl  # Initial Position in x [m]
@@ -42,16 +54,26 @@ class Drone:
         self.psi0 = np.pi * 0 / 180
 
         # --------- Rest of init (DO NOT CHANGE) ---------
-        # Load drone image
-        img_path = "img/drone.png"
-        self.orig_img = pygame.image.load(img_path)
-        # Rescale to drone size
         self.radius_pxl = int(self.radius*self.env.m_to_pxl)
-        self.orig_img = pygame.transform.scale(self.orig_img, (int(self.radius_pxl*2), int(self.radius_pxl*2)))
+        self.orig_img = None
+        if not self.env.headless:
+            # Load drone image
+            img_path = "img/drone.png"
+            self.orig_img = pygame.image.load(img_path)
+            # Rescale to drone size
+            self.orig_img = pygame.transform.scale(self.orig_img, (int(self.radius_pxl*2), int(self.radius_pxl*2)))
+        # Rotated drone images, created lazily per angle step when first drawn, valid for one camera zoom
+        self.rotated_imgs = {}
+        self.rotated_imgs_zoom = 1.0
 
         # Set navigation frame values
         self.pos = np.array([self.x0, self.y0])  # x and y
+        self.pos_last_check = self.pos.copy()  # Position during last collision check
         self.psi = self.psi0  # Yaw angle [rad] (always equal to body frame, since we do not have pitch, roll)
+        self.pos_prev = self.pos  # Position and yaw angle before last physics step, used to interpolate drawing
+        self.psi_prev = self.psi
+        self.draw_pos = self.pos  # Position and yaw angle drawn
+        self.draw_psi = self.psi
         self.speed_nav = np.array([0, 0])
 
         # Set state, forces and dynamic values in BODY FRAME!!
@@ -70,38 +92,119 @@ class Drone:
         self.J = 0.5*self.drone_mass*self.radius**2  # Inertia formula for thin circular disk
 
         # Add colorized drone circle for collision detection later
-        self.drone_circle = pygame.draw.circle(self.env.screen, self.env.YELLOW_t,
-                                               self.env.mysys_to_pygame(self.pos), self.radius_pxl)
+        self.drone_circle = None
+        if not self.env.headless:
+            self.drone_circle = pygame.draw.circle(self.env.screen, self.env.YELLOW_t,
+                                                   self.env.mysys_to_pygame(self.pos), self.radius_pxl)
 
         # Create measurement unit list
         # Add IMU and Laser to drone
-        self.IMU = IMU(drone=self, log_rate=1.0, N_meas=500, noise_perc=0.05)
+        imu_seed, laser_seed = self.seed_sequence.spawn(2)
+        self.IMU = IMU(drone=self, log_rate=1.0, N_meas=500, noise_perc=0.05, seed=imu_seed)
         self.Laser = Laser(drone=self, log_rate=1.0, N_meas=500, n_laser=self.n_laser,
-                           max_range=self.laser_max_range, noise_perc=0.05)
+                           max_range=self.laser_max_range, noise_perc=0.05, seed=laser_seed)
         self.measurement_units = [self.IMU, self.Laser]
+        self.Lidar = None
+        if LIDAR_BEAMS > 0:
+            # Seeded separately, so IMU and Laser noise stay the same with and without LiDAR
+            lidar_seed, = self.seed_sequence.spawn(1)
+            self.Lidar = Lidar(drone=self, log_rate=0.1, N_meas=50, n_beams=LIDAR_BEAMS,
+                               max_range=self.laser_max_range, noise_perc=0.01, seed=lidar_seed)
+            self.measurement_units.append(self.Lidar)
+        self.recorder = None  # Optional TelemetryRecorder, records every physics step
+        self.mapper = None  # Optional OccupancyGrid, adds every new laser measurement
         self.simulated_laser_range = np.zeros(self.n_laser)
         self.simulated_laser_intercep_visual = np.zeros(self.n_laser*2).reshape(self.n_laser, 2)
+        # Lasers are simulated lazily, only when measurements, drawing or other users ask for them
+        self.laser_world = None  # (all_line_obstacles, segment_grid) of last collision check
+        self.laser_dirty = True  # Pose or obstacles changed since lasers were simulated
+        self.laser_worker = LaserWorker() if LASER_THREAD and not self.env.headless else None
+        # Buffers for all points drawn each frame (drone center, heading, force vector end, laser ends), converted
+        # into pygame coordinates in one call without allocation
+        self.draw_points = np.zeros((self.n_laser + 3, 2))  # [m]
+        self.draw_pixels = np.zeros((self.n_laser + 3, 2))  # [pxl]
 
     def update_physics(self):
         self.calculate_forces()
         self.equation_of_motion()
         # Update all measurement unit
         [unit.update(dt=self.env.dt) for unit in self.measurement_units]
+        if self.recorder is not None:
+            self.recorder.record()
+        if self.mapper is not None:
+            self.mapper.integrate(self)
 
     def update_draw(self):
-        # Order is important
+        if self.env.headless:
+            return
+        self.interpolate_draw_pose()
+        if self.env.laser_flag:
+            self.update_laser_visual()
+        self.transform_draw_points()
+        # Order is important, drawings in world must not reach into menu
+        self.env.screen.set_clip(self.env.playground_rect)
         if self.env.laser_flag:
             self.draw_laser()
         self.draw_drone()
         self.draw_vectors()
+        self.env.screen.set_clip(None)
         self.draw_info()
 
+    def interpolate_draw_pose(self):
+        """
+        Set pose to draw between last two physics steps according to the time already passed since the last step
+        """
+        alpha = self.env.interpolation if self.env.flying and not self.env.paused else 1.0
+        self.draw_pos = self.pos_prev + alpha * (self.pos - self.pos_prev)
+        delta_psi = (self.psi - self.psi_prev + np.pi) % (2 * np.pi) - np.pi  # Shortest way around
+        self.draw_psi = (self.psi_prev + alpha * delta_psi) % (2 * np.pi)
+
+    def update_laser_visual(self):
+        """
+        Make sure drawn lasers are up to date, either simulated now for the current pose or taken from worker thread
+        """
+        if self.laser_worker is None or self.laser_world is None:
+            self.get_sim_laser_meas()
+            return
+        self.laser_worker.request(self.pos, self.psi, self.n_laser, self.laser_max_range, *self.laser_world)
+        result = self.laser_worker.latest()
+        if result is not None:
+            self.simulated_laser_intercep_visual = result[1]
+
+    def transform_draw_points(self):
+        """
+        Collect all points drawn for the drone and convert them into pygame coordinates at once
+        """
+        laser_points = self.simulated_laser_intercep_visual
+        if len(self.draw_points) != len(laser_points) + 3:
+            # Number of lasers differs, e.g. in replay of a flight with other laser settings
+            self.draw_points = np.zeros((len(laser_points) + 3, 2))
+            self.draw_pixels = np.zeros((len(laser_points) + 3, 2))
+        points = self.draw_points
+        points[0] = self.draw_pos
+        # Heading line end
+        points[1, 0] = -np.sin(self.draw_psi)
+        points[1, 1] = np.cos(self.draw_psi)
+        points[1] *= self.radius * 0.8
+        points[1] += self.draw_pos
+        # Force vector end
+        max_user_F_length = 3 * self.radius
+        points[2] = np.dot(self.body_to_nav, self.F)
+        points[2] *= max_user_F_length / self.F_user_max
+        points[2] += self.draw_pos
+        points[3:] = laser_points
+        self.env.mysys_to_pygame(points, out=self.draw_pixels)
+
     def equation_of_motion(self):
+        self.pos_prev = self.pos
+        self.psi_prev = self.psi
+        self.laser_dirty = True
         self.body_to_nav = np.array([[np.cos(self.psi), -np.sin(self.psi)],
                                     [np.sin(self.psi), np.cos(self.psi)]])
         # simple semi-implicit-euler used here
         self.speed_nav = self.speed_nav + np.dot(self.body_to_nav, self.acc) * self.env.dt
-        self.speed = np.dot(np.linalg.inv(self.body_to_nav), self.speed_nav)  # More stable to reverse it again here
+        # More stable to reverse it again here, rotation matrix is orthonormal so its inverse is the transpose
+        self.speed = np.dot(self.body_to_nav.T, self.speed_nav)
         self.pos = self.pos + self.speed_nav * self.env.dt
         self.r = self.r + self.r_dot * self.env.dt
         self.psi = (self.psi + self.r * self.env.dt + 2 * np.pi) % (2 * np.pi)  # Values are always between 0 and 2 pi
@@ -127,29 +230,48 @@ class Drone:
         self.env.display_text(heading_str, (self.env.MENU_MID_COORD, self.env.SCREEN_HEIGHT - 50), 16)
 
     def draw_drone(self):
-        img = pygame.transform.rotozoom(self.orig_img, self.psi*180/np.pi, 1)
+        img = self.get_rotated_img(self.draw_psi*180/np.pi)
         img_rect = img.get_rect()
-        img_rect.center = self.env.mysys_to_pygame(self.pos)
+        img_rect.center = self.draw_pixels[0]
         # Add circle for better boundary visibility
-        self.drone_circle = pygame.draw.circle(self.env.screen, self.env.YELLOW_t, img_rect.center, self.radius_pxl)
+        self.drone_circle = pygame.draw.circle(self.env.screen, self.env.YELLOW_t, img_rect.center,
+                                               int(self.radius_pxl * self.env.camera.zoom))
         # Add line for better heading visibility
-        outer_circle_coord = self.env.mysys_to_pygame(self.pos
-                                                      + self.radius * 0.8
-                                                      * np.array([-np.sin(self.psi), np.cos(self.psi)]))
-        pygame.draw.line(self.env.screen, self.env.BLACK, img_rect.center, outer_circle_coord, width=2)
+        pygame.draw.line(self.env.screen, self.env.BLACK, img_rect.center, self.draw_pixels[1], width=2)
         self.env.screen.blit(img, img_rect)
 
+    def get_rotated_img(self, angle):
+        """
+        Get drone image rotated to the closest multiple of the rotation quantum and scaled to camera zoom, each
+        rotation is only created once per zoom
+
+        :param angle: rotation angle [deg]
+        :return: rotated pygame surface
+        """
+        if self.rotated_imgs_zoom != self.env.camera.zoom:
+            self.rotated_imgs = {}
+            self.rotated_imgs_zoom = self.env.camera.zoom
+        n_steps = int(round(360 / self.rotation_quantum))
+        step = int(round(angle / self.rotation_quantum)) % n_steps
+        img = self.rotated_imgs.get(step)
+        if img is None:
+            img = pygame.transform.rotozoom(self.orig_img, step * self.rotation_quantum, self.rotated_imgs_zoom)
+            self.rotated_imgs[step] = img
+        return img
+
     def draw_vectors(self):
         # Draw force vectors
-        max_user_F_length = 3 * self.radius
-        endpoint = self.env.mysys_to_pygame(self.pos + np.dot(self.body_to_nav, self.F)
-                                            / self.F_user_max * max_user_F_length)
-        pygame.draw.line(self.env.screen, self.env.BLUE, self.env.mysys_to_pygame(self.pos), endpoint)
+        pygame.draw.line(self.env.screen, self.env.BLUE, self.draw_pixels[0], self.draw_pixels[2])
 
     def draw_laser(self):
-        for point in self.simulated_laser_intercep_visual:
-            p_t = self.env.mysys_to_pygame(point)
-            pygame.draw.line(self.env.screen, self.env.RED, self.env.mysys_to_pygame(self.pos), p_t)
+        # Only lasers with bounding box in view are drawn
+        points = self.draw_points[3:]
+        view = self.env.camera.visible_rect()
+        visible = np.all(np.maximum(points, self.draw_pos) >= view[0:2], axis=1) & \
+            np.all(np.minimum(points, self.draw_pos) <= view[2:4], axis=1)
+        start = self.draw_pixels[0]
+        for p_t in self.draw_pixels[3:][visible]:
+            pygame.draw.line(self.env.screen, self.env.RED, start, p_t)
             pygame.draw.circle(self.env.screen, self.env.RED, p_t, 2)
 
     def apply_forces(self, F, M):
@@ -180,27 +302,47 @@ class Drone:
             M_temp += -self.M_user_max
         self.apply_forces(F_temp, M_temp)
 
-    def check_collision(self, all_line_obstacles):
+    def check_collision(self, all_line_obstacles, segment_grid=None):
         """
+        Check the whole path of the drone since the last call for contact with any wall (swept circle)
 
         :param all_line_obstacles: list of np.ndarrays (dim=2) containing coordinates of lines
+        :param segment_grid: optional SegmentGrid of the obstacles, only nearby segments are checked when given
+        :return: True, if drone crashed and was reset
         """
-        for coords in all_line_obstacles:
-            for i in range(len(coords)-1):
-                intersections = circle_line_intersection(self.pos, self.radius, coords[i], coords[i+1], False)
-                if len(intersections) >= 1:
-                    self.env.pause("YOU CRASHED")
-                    self.reset_drone()
-
-        # TODO Help function for creating true artificial laser measurements placed here for now to access obstacles,
-        #  think about good way of refactoring
-        self.simulate_laser_meas(self.n_laser, self.laser_max_range, all_line_obstacles)
+        # Sweep drone circle from position of last check to current one, so a fast drone can not tunnel through walls
+        pos_start = self.pos_last_check
+        if segment_grid is not None:
+            reach = self.radius + np.linalg.norm(self.pos - pos_start) / 2
+            candidates = segment_grid.segments[segment_grid.query_circle((pos_start + self.pos) / 2, reach)]
+        else:
+            candidates = polylines_to_segments(all_line_obstacles)
+        toi, _ = swept_circle_segments(pos_start, self.pos, self.radius, candidates)
+        self.pos_last_check = self.pos.copy()
+        crashed = bool(toi[0] <= 1)
+        if crashed:
+            self.env.pause("YOU CRASHED")
+            self.reset_drone()
+
+        # Remember obstacles for true artificial laser measurements, they are simulated lazily in get_sim_laser_meas
+        self.laser_world = (all_line_obstacles, segment_grid)
+        self.laser_dirty = True
+        return crashed
 
     def reset_drone(self):
+        # Make sure flight until now is saved
+        if self.recorder is not None:
+            self.recorder.flush()
         # Set navigation frame values
         self.pos = np.array([self.x0, self.y0])  # x and y
+        self.pos_last_check = self.pos.copy()  # Position during last collision check
         self.psi = self.psi0  # Yaw angle [rad] (always equal to body frame, since we do not have pitch, roll)
+        self.pos_prev = self.pos  # Position and yaw angle before last physics step, used to interpolate drawing
+        self.psi_prev = self.psi
+        self.draw_pos = self.pos  # Position and yaw angle drawn
+        self.draw_psi = self.psi
         self.speed_nav = np.array([0, 0])
+        self.laser_dirty = True
 
         # Set state, forces and dynamic values in BODY FRAME!!
         self.r = 0  # Yaw Rate [rad/s]
@@ -217,7 +359,7 @@ class Drone:
         # Reset Measurement units
         [unit.reset() for unit in self.measurement_units]
 
-    def simulate_laser_meas(self, no_laser, max_range, all_line_obs):
+    def simulate_laser_meas(self, no_laser, max_range, all_line_obs, segment_grid=None):
         """
         Help function to generate true laser range measurements
         (This updates self.simulated_laser_range and points for visualization)
@@ -225,57 +367,42 @@ class Drone:
         :param max_range: maximum range of laser measurement
         :param all_line_obs: list of np.ndarrays (dim=2) containing coordinates of lines
         :param no_laser: number of lasers
+        :param segment_grid: optional SegmentGrid of the obstacles, only segments along the lasers are checked when given
         """
-        angle_step = 2*np.pi/no_laser
-        current_angle = 0.0
-        all_laser_dis = []  # Init to gather all laser meas
-        all_laser_p_visual = []  # Init to gather all points for visualization
-        temp_closest_dis = max_range  # Init
-        for i_laser in range(no_laser):
-            T_laser_b_to_nav = np.array([-np.sin(self.psi + current_angle), np.cos(self.psi + current_angle)])
-            # Second point in navigation frame for current laser iteration
-            max_laser_point = self.pos + T_laser_b_to_nav * max_range
-            for coords in all_line_obs:
-                for i_coord in range(len(coords) - 1):
-                    intersec = line_intersection([coords[i_coord], coords[i_coord+1]], [self.pos, max_laser_point])
-                    # Check if intersection available
-                    if intersec:
-                        temp_closest_dis = distance(self.pos, intersec)
-                        max_laser_point = intersec  # When used like this, we always check to closes point found before
-            # TODO: Check, what a laser would return, when out of laser range
-            if temp_closest_dis == max_range:
-                temp_closest_dis = np.nan
-            all_laser_dis.append(temp_closest_dis)
-            all_laser_p_visual.append(max_laser_point)
-            current_angle += angle_step
-            temp_closest_dis = max_range
-
-        self.simulated_laser_intercep_visual = np.array(all_laser_p_visual)
-        self.simulated_laser_range = np.array(all_laser_dis)
+        self.simulated_laser_range, self.simulated_laser_intercep_visual = simulate_lasers(
+            self.pos, self.psi, no_laser, max_range, all_line_obs, segment_grid)
+        self.laser_dirty = False
 
     def get_sim_laser_meas(self):
         """
-        
+        Lasers are simulated here for the current pose, if not done yet since the last change
+
         :return: [lasermeas_1, lasermeas_2, ..., lasermeas_n]
         """
-        
+        if self.laser_dirty and self.laser_world is not None:
+            self.simulate_laser_meas(self.n_laser, self.laser_max_range, *self.laser_world)
         return self.simulated_laser_range
 
 
 class MeasurementUnit:
-    def __init__(self, drone, log_rate, N_meas):
+    def __init__(self, drone, log_rate, N_meas, seed=None):
         """
         This class should be used for each measurement unit as a parent class
 
         :param drone: drone it belongs to
         :param log_rate: log rate the measurement will be updated with
         :param N_meas: Number of measurements saved in the time sliding data array
+        :param seed: seed (or numpy SeedSequence) of random generator used for noise of this unit
         """
         self.drone = drone  # Drone Instance
+        self.rng = np.random.default_rng(seed)  # Own random generator, so noise is reproducible
+        self.noise_model = NoiseModel(self.rng)  # No noise by default, see child classes
         self.log_rate = log_rate  # Logging rate in [s]
         self.accumulator = 0.0  # Accumulator to check, if log time is reached
         self.timestamp = 0.0
-        self.measurements = None  # Initiate measurement with next function
+        self.measurements = None  # Initiate measurement with next function, used as circular buffer
+        self.head = 0  # Row index of newest measurement in circular buffer
+        self.n_logged = 0  # Number of measurements logged since creation
         self.N_meas = N_meas
         self.initialize_meas(self.N_meas)
 
@@ -290,34 +417,37 @@ class MeasurementUnit:
     def reset(self):
         self.accumulator = 0.0  # Accumulator to check, if log time is reached
         self.timestamp = 0.0
+        self.head = 0
         self.initialize_meas(self.N_meas)
 
     def get_current_meas(self):
-        return self.measurements[0]
+        # Copy, since row in circular buffer is overwritten later
+        return self.measurements[self.head].copy()
 
     def get_all_meas(self):
-        return self.measurements
-
-    def add_noise(self, data_list, perc):
         """
-        Function to add random noise to a parameter by percentage
-        :param data_list: data to put noise on
-        :param perc: percentage of noise between 0 .. 1
-        :return: np.array data with noise on it
+        :return: ordered copy of all measurements, newest first
         """
+        return np.concatenate([self.measurements[self.head:], self.measurements[:self.head]])
 
-        noise_perc = random.uniform(-perc, perc)  # Generate random noise
-        inp_data = np.array(data_list)  # make sure it is as array
-        data_with_noise = inp_data + noise_perc * inp_data
-        return data_with_noise
+    def get_raw_meas(self):
+        """
+        Zero-copy access to circular measurement buffer. Row head is the newest measurement, older measurements
+        follow with increasing row index and wrap around at the end of the array.
+
+        :return: tuple (backing array, head index)
+        """
+        return self.measurements, self.head
 
     def add_meas(self, new_m):
         """
-        Add new measurement to sliding data array
+        Add new measurement to sliding data array (circular buffer, oldest measurement is overwritten)
 
         :param new_m: list or array with new measurements
         """
-        self.measurements = np.vstack([new_m, self.measurements[0:-1]])
+        self.head = (self.head - 1) % self.N_meas
+        self.measurements[self.head] = new_m
+        self.n_logged += 1
 
     def create_meas(self):
         """
@@ -339,14 +469,16 @@ class MeasurementUnit:
 
 
 class IMU(MeasurementUnit):
-    def __init__(self, drone, log_rate, N_meas, noise_perc):
+    def __init__(self, drone, log_rate, N_meas, noise_perc, noise_model=None, seed=None):
         """
         See parent class, added noise variable
 
         :param noise_perc: Percentage of noise in measurement (w.r.t to absolute value)
+        :param noise_model: optional NoiseModel replacing the percentage noise, e.g. with gaussian noise and bias
         """
-        super().__init__(drone, log_rate, N_meas)
+        super().__init__(drone, log_rate, N_meas, seed)
         self.noise_perc = noise_perc  # Add percentage noise to previous call, could choose other forms aswell
+        self.noise_model = noise_model or NoiseModel(self.rng, uniform_perc=noise_perc)
 
     def create_meas(self):
         """
@@ -356,7 +488,7 @@ class IMU(MeasurementUnit):
         acc_x = self.drone.acc[0]
         acc_y = self.drone.acc[1]
         omega_z = self.drone.r_dot
-        noise_data = self.add_noise([acc_x, acc_y, omega_z], self.noise_perc)
+        noise_data = self.noise_model.apply([acc_x, acc_y, omega_z])
         new_meas = np.hstack([self.timestamp, noise_data])
         return new_meas
 
@@ -366,16 +498,19 @@ class IMU(MeasurementUnit):
 
 
 class Laser(MeasurementUnit):
-    def __init__(self, drone, log_rate, N_meas, n_laser, max_range, noise_perc):
+    def __init__(self, drone, log_rate, N_meas, n_laser, max_range, noise_perc, noise_model=None, seed=None):
         """
         See parent class, added noise variable and number of lasers
 
         :param noise_perc: Percentage of noise in measurement (w.r.t to absolute value)
+        :param noise_model: optional NoiseModel replacing the percentage noise, e.g. with dropout and quantization
         """
         self.n_laser = n_laser  # Number of laser coming from the drone
         self.max_range = max_range
-        super().__init__(drone, log_rate, N_meas)
+        self.beam_angles = np.arange(n_laser) * (2 * np.pi / n_laser)  # Angles w.r.t. body frame [rad]
+        super().__init__(drone, log_rate, N_meas, seed)
         self.noise_perc = noise_perc  # Add percentage noise for each laser measurement and choose number of laser
+        self.noise_model = noise_model or NoiseModel(self.rng, uniform_perc=noise_perc)
 
     def create_meas(self):
         """
@@ -384,9 +519,110 @@ class Laser(MeasurementUnit):
         """
 
         new_laser_meas = self.drone.get_sim_laser_meas()
-        noise_data = self.add_noise(new_laser_meas, self.noise_perc)
+        noise_data = self.noise_model.apply(new_laser_meas)
         new_meas = np.hstack([self.timestamp, noise_data])
         return new_meas
 
     def initialize_meas(self, N_meas):
         self.measurements = np.zeros((N_meas, self.n_laser+1))
+
+
+class Lidar(MeasurementUnit):
+    def __init__(self, drone, log_rate, N_meas, n_beams, max_range, noise_perc, fov=2 * np.pi, offset=0.0,
+                 noise_model=None, seed=None):
+        """
+        Rotating LiDAR, one rotation takes log_rate and gives one measurement. The beams fire one after another
+        evenly spread over the rotation, so each beam sees the drone pose at its own firing time (a moving drone
+        distorts the scan like a real LiDAR does). All beams due within a physics step are cast in one batch.
+        See parent class, added noise variable, beam arrangement and range.
+
+        :param n_beams: number of beams per rotation
+        :param max_range: maximum range of beams [m]
+        :param noise_perc: Percentage of noise in range measurement (w.r.t to absolute value)
+        :param fov: field of view covered by the beams [rad], 2 pi means full circle without duplicated beam
+        :param offset: angle of first beam w.r.t. body frame [rad], angle 0 points along the body y-axis
+        :param noise_model: optional NoiseModel for ranges replacing the percentage noise
+        """
+        self.n_beams = n_beams
+        self.max_range = max_range
+        self.beam_angles = offset + np.arange(n_beams) * (fov / n_beams)  # Angles w.r.t. body frame [rad]
+        self.beam_times = np.arange(n_beams) * (log_rate / n_beams)  # Firing time since start of rotation [s]
+        # Scan in progress, beams not fired yet are np.nan
+        self.scan_ranges = np.full(n_beams, np.nan)
+        self.scan_intensities = np.zeros(n_beams)
+        self.scan_pos = np.zeros((n_beams, 2))  # Drone position each beam was fired at [m]
+        self.scan_psi = np.zeros(n_beams)  # Drone yaw angle each beam was fired at [rad]
+        # Beam poses of the last finished rotation, the next rotation may already overwrite the scan poses
+        self.meas_pos = np.zeros((n_beams, 2))
+        self.meas_psi = np.zeros(n_beams)
+        super().__init__(drone, log_rate, N_meas, seed)
+        self.noise_perc = noise_perc
+        self.noise_model = noise_model or NoiseModel(self.rng, uniform_perc=noise_perc)
+
+    def update(self, dt):
+        rotation_time = self.accumulator
+        self.accumulator += dt
+        while True:
+            # Fire all beams with firing time in this step at the current pose
+            first, last = np.searchsorted(self.beam_times, [rotation_time, min(self.accumulator, self.log_rate)])
+            if last > first:
+                self.fire(first, last)
+            if self.accumulator < self.log_rate:
+                break
+            self.add_meas(self.create_meas())
+            self.accumulator -= self.log_rate
+            rotation_time = 0.0
+        self.timestamp += dt
+
+    def fire(self, first, last):
+        """
+        Cast beams first .. last - 1 of the current rotation at the current drone pose
+
+        :param first: index of first beam
+        :param last: index after last beam
+        """
+        self.scan_pos[first:last] = self.drone.pos
+        self.scan_psi[first:last] = self.drone.psi
+        if self.drone.laser_world is None:
+            # Obstacles are only known after the first collision check
+            self.scan_ranges[first:last] = np.nan
+            self.scan_intensities[first:last] = 0
+            return
+        ranges, intensities = simulate_lidar(self.drone.pos, self.drone.psi + self.beam_angles[first:last],
+                                             self.max_range, *self.drone.laser_world)
+        self.scan_ranges[first:last] = ranges
+        self.scan_intensities[first:last] = intensities
+
+    def create_meas(self):
+        """
+
+        :return: list with [timestamp[s] (end of rotation), range_1[m], ..., range_n[m], intensity_1, ...,
+            intensity_n], ranges are np.nan without hit, intensities between 0 .. 1
+        """
+        noise_data = self.noise_model.apply(self.scan_ranges)
+        new_meas = np.hstack([self.timestamp, noise_data, self.scan_intensities])
+        self.meas_pos[:] = self.scan_pos
+        self.meas_psi[:] = self.scan_psi
+        return new_meas
+
+    def get_ranges(self, meas):
+        """
+        :param meas: one measurement, e.g. from get_current_meas()
+        :return: ranges of all beams [m]
+        """
+        return meas[1:self.n_beams + 1]
+
+    def get_intensities(self, meas):
+        """
+        :param meas: one measurement, e.g. from get_current_meas()
+        :return: intensities of all beams
+        """
+        return meas[self.n_beams + 1:]
+
+    def reset(self):
+        super().reset()
+        self.scan_ranges[:] = np.nan
+        self.scan_intensities[:] = 0
+
+    def initialize_meas(self, N_meas):
+        self.measurements = np.zeros((N_meas, 2 * self.n_beams + 1))
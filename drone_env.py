@@ -0,0 +1,244 @@
+""" Gym-style reset()/step() interface to train controllers on headless simulations
+
+Observation of one drone (all in one float array):
+[laser_range_1 .. laser_range_n [m] (max range without hit), AccX, AccY [m/s^2], OmegaZ [rad/s^2], x, y [m], psi [rad]]
+Action of one drone: [F_xb, F_yb [N], M [Nm]] in body frame, clipped to the user limits of the drone.
+"""
+
+import os
+import time
+import numpy as np
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+from environment import Environment, HEADLESS_DT  # noqa: E402
+from obstacles import Obstacles  # noqa: E402
+from simulation import Simulation  # noqa: E402
+from swarm import DroneSwarm  # noqa: E402
+from drone import NUMBER_LASER, LASER_RANGE_MAX, F_USER_MAX, M_USER_MAX  # noqa: E402
+from tools.swept_collision import swept_circle_segment_pairs  # noqa: E402
+
+# Training settings
+ALIVE_REWARD = 0.01  # Reward for every step without crash | Default: 0.01
+CRASH_REWARD = -10.0  # Reward for the step with a crash | Default: -10.0
+MAX_EPISODE_STEPS = 3600  # Episode is ended (truncated) after this number of steps | Default: 3600
+
+
+def observation_size(n_laser):
+    """
+    :param n_laser: number of lasers
+    :return: length of observation of one drone
+    """
+    return n_laser + 6
+
+
+class DroneEnv:
+    def __init__(self, obstacles=None, dt=HEADLESS_DT, seed=None, max_steps=MAX_EPISODE_STEPS):
+        """
+        Single headless drone with full measurement units, same physics and step order as the interactive game
+
+        :param obstacles: list of np.ndarrays (dim=2) containing coordinates of lines [m] added to the base wall
+        :param dt: fixed time step [s]
+        :param seed: seed for measurement noise
+        :param max_steps: number of steps until episode is truncated
+        """
+        self.sim = Simulation(dt=dt, seed=seed)
+        for coords in obstacles or []:
+            self.sim.obstacles.add_obstacle(np.asarray(coords, dtype=float))
+        self.drone = self.sim.drone
+        self.max_steps = max_steps
+        self.episode_steps = 0
+        self.last_observation = None  # Observation returned last, a crash is detected for this pose in the next step
+
+    def reset(self):
+        """
+        :return: observation of initial state
+        """
+        self.drone.reset_drone()
+        self.sim.env.paused = False
+        self.episode_steps = 0
+        self.last_observation = self.observe()
+        return self.last_observation
+
+    def step(self, action):
+        """
+        :param action: [F_xb, F_yb, M]
+        :return: tuple (observation, reward, done, info), info contains "crashed" and, if done, "terminal_observation"
+            with the last observation of the episode (like VectorDroneEnv). After a crash the drone is already back
+            at its initial position, after done without crash reset() has to be called.
+        """
+        drone = self.drone
+        action = np.asarray(action, dtype=float)
+        drone.apply_forces(np.clip(action[0:2], -drone.F_user_max, drone.F_user_max),
+                           float(np.clip(action[2], -drone.M_user_max, drone.M_user_max)))
+        crashed = self.sim.step()
+        self.episode_steps += 1
+        done = crashed or self.episode_steps >= self.max_steps
+        if crashed:
+            self.episode_steps = 0
+        reward = CRASH_REWARD if crashed else ALIVE_REWARD
+        observation = self.observe()
+        info = {'crashed': crashed}
+        if done:
+            # The crash is found at the start of the step (same order as the game), before the drone moved again
+            info['terminal_observation'] = self.last_observation if crashed else observation
+        self.last_observation = observation
+        return observation, reward, done, info
+
+    def observe(self):
+        drone = self.drone
+        # Simulated explicitly, since obstacles are only known to the drone after its first collision check
+        drone.simulate_laser_meas(drone.n_laser, drone.laser_max_range, self.sim.obstacles.all_obstacles,
+                                  self.sim.obstacles.segment_grid)
+        laser = np.nan_to_num(drone.get_sim_laser_meas(), nan=drone.laser_max_range)
+        return np.concatenate([laser, drone.acc, [drone.r_dot], drone.pos, [drone.psi]]).astype(float)
+
+
+class VectorDroneEnv:
+    def __init__(self, n_envs, obstacles=None, x0=None, y0=None, psi0=None, dt=HEADLESS_DT,
+                 max_steps=MAX_EPISODE_STEPS, n_laser=NUMBER_LASER, laser_range=LASER_RANGE_MAX, laser_noise=None,
+                 imu_noise=None, reward_fn=None):
+        """
+        Many independent drones in one static world advanced in lockstep. Physics, collision and lasers are computed
+        for all drones at once with array operations, there is no Python loop over drones.
+        Drones do not collide with each other. Drones which crashed or reached max_steps are reset automatically.
+
+        :param n_envs: number of drones
+        :param obstacles: list of np.ndarrays (dim=2) containing coordinates of lines [m] added to the base wall
+        :param x0: initial position in x [m], scalar or array with shape (n_envs,), default like Drone
+        :param y0: initial position in y [m], scalar or array with shape (n_envs,), default like Drone
+        :param psi0: initial yaw angle [rad], scalar or array with shape (n_envs,)
+        :param dt: fixed time step [s]
+        :param max_steps: number of steps until episode of a drone is truncated
+        :param n_laser: number of lasers per drone
+        :param laser_range: maximum range of lasers [m]
+        :param laser_noise: optional NoiseModel for laser ranges
+        :param imu_noise: optional NoiseModel for AccX, AccY and OmegaZ
+        :param reward_fn: optional callable(env, crashed) returning rewards with shape (n_envs,)
+        """
+        self.env = Environment(headless=True, dt=dt)
+        self.obstacles = Obstacles(self.env)
+        for coords in obstacles or []:
+            self.obstacles.add_obstacle(np.asarray(coords, dtype=float))
+        self.swarm = DroneSwarm(self.env, n_envs, x0, y0, psi0)
+        self.n_envs = n_envs
+        self.max_steps = max_steps
+        self.n_laser = n_laser
+        self.laser_range = laser_range
+        self.laser_noise = laser_noise
+        self.imu_noise = imu_noise
+        self.reward_fn = reward_fn
+        self.observation_size = observation_size(n_laser)
+        self.episode_steps = np.zeros(n_envs, dtype=np.int64)
+        # Laser angles w.r.t. body frame, same arrangement as Drone lasers
+        self.laser_angles = np.arange(n_laser) * (2 * np.pi / n_laser)
+        self.pos_before = np.zeros((n_envs, 2))  # Positions before physics step for swept collision [m]
+
+    def reset(self, mask=None):
+        """
+        :param mask: optional boolean array or indices selecting drones to reset, default all
+        :return: observations of all drones, np.ndarray with shape (n_envs, observation_size)
+        """
+        self.swarm.reset(mask)
+        self.episode_steps[slice(None) if mask is None else mask] = 0
+        return self.observe()
+
+    def step(self, actions):
+        """
+        :param actions: np.ndarray with shape (n_envs, 3) and rows [F_xb, F_yb, M]
+        :return: tuple (observations, rewards, dones, info) with first dimension n_envs. info contains boolean
+            arrays "crashed" and "truncated" and "terminal_observation" with the last observations of all done drones
+            (observations of these drones are already the ones after the automatic reset)
+        """
+        swarm = self.swarm
+        actions = np.asarray(actions, dtype=float).reshape(self.n_envs, 3)
+        np.clip(actions[:, 0:2], -F_USER_MAX, F_USER_MAX, out=swarm.F_user)
+        np.clip(actions[:, 2], -M_USER_MAX, M_USER_MAX, out=swarm.M_user)
+        self.env.update()
+        self.pos_before[:] = swarm.pos
+        swarm.update_physics()
+        crashed = self.check_collision()
+        self.episode_steps += 1
+        truncated = ~crashed & (self.episode_steps >= self.max_steps)
+        dones = crashed | truncated
+        rewards = self.reward_fn(self, crashed) if self.reward_fn is not None else \
+            np.where(crashed, CRASH_REWARD, ALIVE_REWARD)
+        observations = self.observe()
+        info = {'crashed': crashed, 'truncated': truncated}
+        if np.any(dones):
+            info['terminal_observation'] = observations[dones]
+            # Only the reset drones are observed again
+            self.swarm.reset(dones)
+            self.episode_steps[dones] = 0
+            observations[dones] = self.observe(dones)
+        return observations, rewards, dones, info
+
+    def observe(self, mask=None):
+        """
+        :param mask: optional boolean array or indices selecting drones to observe, default all
+        :return: observations of selected drones, np.ndarray with shape (n_selected, observation_size)
+        """
+        swarm = self.swarm
+        drones = slice(None) if mask is None else np.arange(self.n_envs)[mask]
+        pos = swarm.pos[drones]
+        observations = np.empty((len(pos), self.observation_size))
+        observations[:, 0:self.n_laser] = self.simulate_lasers(drones)
+        imu = observations[:, self.n_laser:self.n_laser + 3]
+        imu[:, 0:2] = swarm.acc[drones]
+        imu[:, 2] = swarm.r_dot[drones]
+        if self.imu_noise is not None:
+            imu[:] = self.imu_noise.apply(imu)
+        observations[:, self.n_laser + 3:self.n_laser + 5] = pos
+        observations[:, self.n_laser + 5] = swarm.psi[drones]
+        return observations
+
+    def check_collision(self):
+        """
+        Sweep every drone along its step, so fast drones can not tunnel through walls. Only segments in grid cells
+        around each sweep are solved (broad phase of all drones at once with SegmentGrid.query_box_pairs).
+
+        :return: boolean array with shape (n_envs,), True for crashed drones
+        """
+        swarm = self.swarm
+        grid = self.obstacles.segment_grid
+        boxes = np.hstack([np.minimum(self.pos_before, swarm.pos) - swarm.radius,
+                           np.maximum(self.pos_before, swarm.pos) + swarm.radius])
+        drones, ids = grid.query_box_pairs(boxes)
+        toi = np.full(self.n_envs, np.inf)
+        np.minimum.at(toi, drones, swept_circle_segment_pairs(self.pos_before[drones], swarm.pos[drones], swarm.radius,
+                                                              grid.segments[ids]))
+        return toi <= 1
+
+    def simulate_lasers(self, drones=slice(None)):
+        """
+        Only segments in grid cells along each laser up to its closest hit are solved (SegmentGrid.cast_rays).
+
+        :param drones: indices or slice selecting drones, default all
+        :return: laser ranges of selected drones, np.ndarray with shape (n_selected, n_laser), max range without hit
+            [m]
+        """
+        angles = (self.swarm.psi[drones, None] + self.laser_angles).ravel()
+        directions = np.column_stack([-np.sin(angles), np.cos(angles)])
+        origins = np.repeat(self.swarm.pos[drones], self.n_laser, axis=0)
+        distance, _ = self.obstacles.segment_grid.cast_rays(origins, directions, self.laser_range)
+        ranges = np.minimum(distance, self.laser_range).reshape(-1, self.n_laser)
+        if self.laser_noise is not None:
+            ranges = np.nan_to_num(self.laser_noise.apply(ranges), nan=self.laser_range)
+        return ranges
+
+
+if __name__ == "__main__":
+    # Quick throughput check with random actions
+    n_envs = 1024
+    vec_env = VectorDroneEnv(n_envs, psi0=np.linspace(0, 2 * np.pi, n_envs, endpoint=False))
+    vec_env.reset()
+    rng = np.random.default_rng(0)
+    n = 200
+    actions = rng.uniform(-1, 1, size=(n, n_envs, 3))
+    n_done = 0
+    start = time.perf_counter()
+    for i in range(n):
+        _, _, dones, _ = vec_env.step(actions[i])
+        n_done += int(np.sum(dones))
+    duration = time.perf_counter() - start
+    print("{} drones x {} steps in {:.2f} s: {:.0f} steps/s, {} episodes ended".format(
+        n_envs, n, duration, n_envs * n / duration, n_done))
@@ -1,15 +1,28 @@
 """ Class to handle all environment and setting related stuff"""
 
+from collections import OrderedDict
 import pygame
+import numpy as np
+from camera import Camera
 
 # Settings for environment:
 METER_TO_PIXEL = 100  # Factor to scale playground between pixel and meters (default drone size is ~0.3m)
 SCREEN_WIDTH = 1200  # Minimum Recommended: 1100
 SCREEN_HEIGHT = 800  # Minimum recommended: 700
+TEXT_CACHE_SIZE = 256  # Maximum number of rendered text surfaces kept for reuse | Default: 256
+HEADLESS_DT = 1 / 60  # Fixed time step of headless simulation without display [s] | Default: 1/60
+FRAME_RATE = 60  # Maximum frames per second drawn | Default: 60
+PHYSICS_RATE = 240  # Physics steps per second, independent of frame rate [Hz] | Default: 240
+MAX_SUBSTEPS = 8  # Maximum physics steps per frame, simulation slows down instead of lagging behind | Default: 8
+BUSY_LOOP = False  # Wait for next frame with busy loop (more precise, but uses full CPU core) | Default: False
 
 
 class Environment:
-    def __init__(self):
+    def __init__(self, headless=False, dt=HEADLESS_DT):
+        """
+        :param headless: Run without display and pygame surfaces, time step is fixed to dt
+        :param dt: fixed time step in headless mode [s]
+        """
         # --------- Environment Settings ---------
         # Define conversion rate between pixel and metres
         self.m_to_pxl = METER_TO_PIXEL
@@ -19,8 +32,8 @@ class Environment:
         self.SCREEN_HEIGHT = SCREEN_HEIGHT
 
         # ---------- Rest of init (DO NOT CHANGE) ----------
-        # Initialize pygame
-        pygame.init()
+        self.headless = headless
+        self.fixed_dt = dt
         # Define colors
         self.BLACK = (0, 0, 0)
         self.WHITE = (255, 255, 255)
@@ -31,16 +44,33 @@ class Environment:
         self.YELLOW_t = (255, 255, 0, 100)
         # Define width of where Simulation takes place
         self.PLAYGROUND_WIDTH = self.SCREEN_WIDTH * 2 / 3
-        # Create clock
-        self.clock = pygame.time.Clock()
-        self.dt = 0
+        self.playground_rect = pygame.Rect(0, 0, int(self.PLAYGROUND_WIDTH), self.SCREEN_HEIGHT)
+        # Part of the world shown in the playground, the world can be larger than the screen
+        self.camera = Camera(self)
+        self.dt = 0  # Time step of physics [s]
         self.total_time = 0
-        # Create the screen object
-        self.screen = pygame.display.set_mode((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
-        # Set Caption
-        pygame.display.set_caption('2D Drone Simulation by Erik')
-        # Fill the screen with White
-        self.screen.fill(self.WHITE)
+        # Fixed time step scheduling: frame time is accumulated and consumed in physics steps of equal size
+        self.frame_rate = FRAME_RATE
+        self.physics_dt = 1 / PHYSICS_RATE
+        self.max_substeps = MAX_SUBSTEPS
+        self.busy_loop = BUSY_LOOP
+        self.frame_dt = 0  # Time since last frame [s]
+        self.accumulator = 0.0  # Frame time not simulated yet [s]
+        self.n_substeps = 0  # Number of physics steps to do in current frame
+        self.interpolation = 1.0  # Fraction of next physics step already passed, used to draw in between states
+        self.clock = None
+        self.screen = None
+        if not self.headless:
+            # Initialize pygame
+            pygame.init()
+            # Create clock
+            self.clock = pygame.time.Clock()
+            # Create the screen object
+            self.screen = pygame.display.set_mode((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
+            # Set Caption
+            pygame.display.set_caption('2D Drone Simulation by Erik')
+            # Fill the screen with White
+            self.screen.fill(self.WHITE)
         # Boolean Variables to keep track of main loop modes
         self.running = True
         self.paused = False
@@ -57,54 +87,98 @@ class Environment:
         self.editor_reset = False
         self.laser_button = Button(self, self.GREEN, self.MENU_MID_COORD - 80, 220, 75, 50, 'Laser', fontsize=22)
         self.laser_flag = True
+        # Cached surface with background, menu panel, buttons and instructions, rebuilt after invalidation only
+        self.static_layer = None
 
-        # Create Font beforehand to solve performance issues
+        # Create Font beforehand to solve performance issues, further fonts and rendered texts are cached
         self.standard_font_size = 16
-        self.my_font = pygame.font.SysFont('Comic Sans MS', self.standard_font_size)
+        self.fonts = {}  # (fontsize, under_line) -> pygame font
+        self.text_cache = OrderedDict()  # (text, fontsize, under_line, color) -> rendered surface, least recent first
+        self.text_cache_size = TEXT_CACHE_SIZE
+        self.my_font = None
+        if not self.headless:
+            self.my_font = self.get_font(self.standard_font_size)
 
     def update(self):
-        # TODO: Check if "Fixing time Step" is necessary
-        self.dt = self.clock.tick_busy_loop(60) / 1000  # [s]
-        self.total_time += self.dt  # [s]
+        if self.headless:
+            # Run as fast as possible with fixed time step
+            self.dt = self.fixed_dt
+            self.frame_dt = self.fixed_dt
+            self.n_substeps = 1
+            self.interpolation = 1.0
+        else:
+            if self.busy_loop:
+                self.frame_dt = self.clock.tick_busy_loop(self.frame_rate) / 1000  # [s]
+            else:
+                self.frame_dt = self.clock.tick(self.frame_rate) / 1000  # [s]
+            self.dt = self.physics_dt
+            self.accumulator += self.frame_dt
+            self.n_substeps = int(self.accumulator / self.physics_dt)
+            if self.n_substeps > self.max_substeps:
+                # Drop time which can not be simulated in time anymore, otherwise every frame takes longer
+                self.n_substeps = self.max_substeps
+                self.accumulator %= self.physics_dt
+            else:
+                self.accumulator -= self.n_substeps * self.physics_dt
+            self.interpolation = self.accumulator / self.physics_dt
+        self.total_time += self.n_substeps * self.dt  # [s]
 
     def draw_environment(self):
-        self.screen.fill(self.WHITE)
-        self.create_game_menu()
+        if self.static_layer is None:
+            self.static_layer = pygame.Surface((self.SCREEN_WIDTH, self.SCREEN_HEIGHT)).convert()
+            self.static_layer.fill(self.WHITE)
+            self.create_game_menu(self.static_layer)
+        self.screen.blit(self.static_layer, (0, 0))
         self.draw_pause()
 
-    def create_game_menu(self):
+    def invalidate_static_layer(self):
+        """
+        Call, whenever something drawn in the static layer (menu, buttons, instructions) changes
+        """
+        self.static_layer = None
+
+    def create_game_menu(self, surface):
+        """
+        :param surface: pygame surface to draw menu on
+        """
         # Add one more surface background for the buttons and the displays later
         panel_surf = pygame.Surface(
             (self.SCREEN_WIDTH - self.PLAYGROUND_WIDTH, self.SCREEN_HEIGHT))  # the size of your rect
         panel_surf.set_alpha(128)  # alpha level
         panel_surf.fill(self.GRAY)  # this fills the entire surface
-        self.screen.blit(panel_surf, (self.PLAYGROUND_WIDTH, 0))  # (0,0) are the top-left coordinates
+        surface.blit(panel_surf, (self.PLAYGROUND_WIDTH, 0))  # (0,0) are the top-left coordinates
         # panel bar description
         self.display_text("Game Menu",
                           (self.MENU_MID_COORD, 50),
                           fontsize=30,
-                          under_line=True)
+                          under_line=True,
+                          surface=surface)
         # Draw buttons!
-        self.editor_button.draw()
-        self.fly_button.draw()
-        self.editor_reset_button.draw()
-        self.laser_button.draw()
+        self.editor_button.draw(surface=surface)
+        self.fly_button.draw(surface=surface)
+        self.editor_reset_button.draw(surface=surface)
+        self.laser_button.draw(surface=surface)
 
         # Draw Instructions
-        self.create_instructions_text()
+        self.create_instructions_text(surface)
 
-    def create_instructions_text(self):
+    def create_instructions_text(self, surface):
+        """
+        :param surface: pygame surface to draw instructions on
+        """
         c = 300
         self.display_text(text='Instructions',
                           pos=(self.MENU_MID_COORD, c),
                           fontsize=22,
                           align='center',
-                          under_line=True)
+                          under_line=True,
+                          surface=surface)
         c += 40
         self.display_text(text='In Flying Mode:',
                           pos=(self.MENU_MID_COORD, c),
                           fontsize=16,
-                          align='center')
+                          align='center',
+                          surface=surface)
         flyingmode_texts = ["Up, Left, Down, Right: Input Force Body Frame",
                             "W and S: Input Force Body Frame (alternative)",
                             "A and D: Input Moment",
@@ -115,51 +189,95 @@ class Environment:
             self.display_text(text=text,
                               pos=(self.MENU_MID_COORD, c),
                               fontsize=16,
-                              align='center')
+                              align='center',
+                              surface=surface)
 
         c += 40
         self.display_text(text='In Editor Mode:',
                           pos=(self.MENU_MID_COORD, c),
                           fontsize=16,
-                          align='center')
+                          align='center',
+                          surface=surface)
 
         editormode_texts = ["Left Click: Add temporary point",
                             "Right Click or Enter: Save temporary input",
-                            "Esc: Remove temporary input"]
+                            "Esc: Remove temporary input",
+                            "Ctrl+S / Ctrl+L: Save / Load map"]
         for text in editormode_texts:
             c += delta
             self.display_text(text=text,
                               pos=(self.MENU_MID_COORD, c),
                               fontsize=16,
-                              align='center')
+                              align='center',
+                              surface=surface)
+
+        c += 40
+        self.display_text(text='View: Mouse Wheel: Zoom, Middle Mouse: Move, F: Follow',
+                          pos=(self.MENU_MID_COORD, c),
+                          fontsize=16,
+                          align='center',
+                          surface=surface)
 
     def draw_pause(self):
         if self.paused:
             self.display_text(self.pause_text, (self.PLAYGROUND_WIDTH / 2, self.SCREEN_HEIGHT / 2), 80)
             self.display_text("Press C to continue", (self.PLAYGROUND_WIDTH / 2, self.SCREEN_HEIGHT / 2 + 100), 40)
 
-    def display_text(self, text: str, pos, fontsize: int = 16, align: str = 'center', under_line=False) -> None:
+    def display_text(self, text: str, pos, fontsize: int = 16, align: str = 'center', under_line=False,
+                     surface=None, color=None) -> None:
         """
         Function to create text with coordinates given in center!
 
         :param align: left or center alignment
         :param text: Text to display
         :param pos: center or left position of text
-        :param fontsize: fontsize number (only change of necessary, causes too much lag otherwise)
+        :param fontsize: fontsize number
         :param under_line: Decide if text should be underlined
+        :param surface: pygame surface to draw on, default is screen
+        :param color: text color, default is black
         """
-        my_font = self.my_font
-        if fontsize != self.standard_font_size:
-            my_font = pygame.font.SysFont('Comic Sans MS', fontsize)
-        if under_line:
-            my_font.set_underline(True)
-        text_surface = my_font.render(text, False, self.BLACK)
+        text_surface = self.render_text(text, fontsize, under_line, self.BLACK if color is None else color)
         text_rect = text_surface.get_rect()
         if align == 'center':
             text_rect.center = pos
         else:
             text_rect.midleft = pos
-        self.screen.blit(text_surface, text_rect)
+        if surface is None:
+            surface = self.screen
+        surface.blit(text_surface, text_rect)
+
+    def get_font(self, fontsize, under_line=False):
+        """
+        Get font from cache, fonts are only created once per size and underline
+
+        :param fontsize: fontsize number
+        :param under_line: Decide if font should be underlined
+        :return: pygame font
+        """
+        key = (fontsize, under_line)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont('Comic Sans MS', fontsize)
+            font.set_underline(under_line)
+            self.fonts[key] = font
+        return font
+
+    def render_text(self, text, fontsize, under_line, color):
+        """
+        Render text or reuse surface rendered before (least recently used one is dropped, when cache is full)
+
+        :return: pygame surface with rendered text
+        """
+        key = (text, fontsize, under_line, color)
+        text_surface = self.text_cache.get(key)
+        if text_surface is not None:
+            self.text_cache.move_to_end(key)
+            return text_surface
+        text_surface = self.get_font(fontsize, under_line).render(text, False, color)
+        self.text_cache[key] = text_surface
+        if len(self.text_cache) > self.text_cache_size:
+            self.text_cache.popitem(last=False)
+        return text_surface
 
     def check_user_input(self, event):
         """
@@ -175,17 +293,20 @@ class Environment:
                 self.fly_button.color = self.RED
                 self.flying = False
                 self.editor = True
+                self.invalidate_static_layer()
             if self.fly_button.is_over(mouse_pos):
                 self.fly_button.color = self.GREEN
                 self.editor_button.color = self.RED
                 self.flying = True
                 self.editor = False
+                self.invalidate_static_layer()
             if self.editor_reset_button.is_over(mouse_pos):
                 self.editor_reset = True
             if self.laser_button.is_over(mouse_pos):
                 self.laser_flag = not self.laser_flag
                 colors = [self.RED, self.GREEN]
                 self.laser_button.color = colors[int(self.laser_flag)]
+                self.invalidate_static_layer()
         if event.type == pygame.KEYDOWN:
             # Check if user wants to pause the game
             if event.key == pygame.K_p:
@@ -220,33 +341,31 @@ class Environment:
                 return True
         return False
 
-    def mysys_to_pygame(self, coord_array):
+    def mysys_to_pygame(self, coord_array, out=None):
         """
-        Convert coordinates into pygame coordinates (origin lower-left => top left, meters => pixel)
+        Convert coordinates into pygame coordinates (origin lower-left => top left, meters => pixel, camera view).
+        Any number of points is converted in one call, the input is never changed.
 
-        :param coord_array: numpy array with coordinates
+        :param coord_array: numpy array with coordinates, shape (2,) or (N, 2)
+        :param out: optional preallocated float array with same shape to write result into (no allocation)
+        :return: converted coordinates (out, if given)
         """
-        coord_array = coord_array * self.m_to_pxl  # Unit conversion
-        # Change coord orig
-        if coord_array.ndim > 1:
-            coord_array[:, 1] = self.SCREEN_HEIGHT - coord_array[:, 1]
-        else:
-            coord_array[1] = self.SCREEN_HEIGHT - coord_array[1]
-        return coord_array
+        out = np.multiply(coord_array, self.camera.pixel_scale, out=out)
+        out += self.camera.pixel_offset
+        return out
 
-    def pygame_to_mysys(self, coord_array):
+    def pygame_to_mysys(self, coord_array, out=None):
         """
-        Convert coordinates into my system coordinates (origin top-left => bottom-left, pixel => meters)
+        Convert coordinates into my system coordinates (origin top-left => bottom-left, pixel => meters, camera view).
+        Any number of points is converted in one call, the input is never changed.
 
-        :param coord_array: numpy array with coordinates
+        :param coord_array: numpy array with coordinates, shape (2,) or (N, 2)
+        :param out: optional preallocated float array with same shape to write result into (no allocation)
+        :return: converted coordinates (out, if given)
         """
-        # Change coord orig
-        if coord_array.ndim > 1:
-            coord_array[:, 1] = self.SCREEN_HEIGHT - coord_array[:, 1]
-        else:
-            coord_array[1] = self.SCREEN_HEIGHT - coord_array[1]
-        coord_array = coord_array/self.m_to_pxl  # Unit conversion
-        return coord_array
+        out = np.subtract(coord_array, self.camera.pixel_offset, out=out)
+        out /= self.camera.pixel_scale
+        return out
 
 
 class Button:
@@ -259,30 +378,35 @@ class Button:
         self.height = height
         self.text = text
         self.fontsize = fontsize
+        self.text_surface = None  # Rendered label, created with first draw call
 
-    def draw(self, outline=True):
+    def draw(self, outline=True, surface=None):
         """
         Call to draw Button with text given during creation
 
         :param outline: Whether button should have black outline
+        :param surface: pygame surface to draw on, default is screen
         """
+        if surface is None:
+            surface = self.env.screen
         if outline:
-            pygame.draw.rect(self.env.screen,
+            pygame.draw.rect(surface,
                              self.env.BLACK,
                              (self.x - self.width/2 - 2, self.y - self.height/2 - 2, self.width + 4, self.height + 4),
                              0)
 
-        pygame.draw.rect(self.env.screen,
+        pygame.draw.rect(surface,
                          self.color,
                          (self.x - self.width/2, self.y - self.height/2, self.width, self.height),
                          0)
 
         if self.text != '':
-            font = pygame.font.SysFont('Comic Sans MS', self.fontsize)
-            text_surface = font.render(self.text, True, self.env.BLACK)
-            text_rect = text_surface.get_rect()
+            if self.text_surface is None:
+                font = self.env.get_font(self.fontsize)
+                self.text_surface = font.render(self.text, True, self.env.BLACK)
+            text_rect = self.text_surface.get_rect()
             text_rect.center = (self.x, self.y)
-            self.env.screen.blit(text_surface, text_rect)
+            surface.blit(self.text_surface, text_rect)
 
     def is_over(self, pos):
         """
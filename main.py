@@ -2,54 +2,147 @@
 Main Program File to start 2D Drone Simulation
 """
 
+import argparse
+import os
 import pygame
 from environment import Environment
 from obstacles import Obstacles
 from drone import Drone
+from profiler import FrameProfiler
+from telemetry import TelemetryRecorder
+from replay import FlightLog, Replay
+from bridge import ControllerBridge, BRIDGE_ADDRESS
+from mapping import OccupancyGrid, MAP_RESOLUTION
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="2D Drone Simulation")
+    parser.add_argument("--profile", metavar="PATH", nargs="?", const="profile.json", default=None,
+                        help="measure frame stages (F3 shows overlay) and write statistics to .json or .csv on exit")
+    parser.add_argument("--record", metavar="PATH", help="record flight telemetry to binary file")
+    parser.add_argument("--replay", metavar="PATH", help="replay flight recorded with --record instead of flying")
+    parser.add_argument("--map", metavar="PATH", help="load map file at start, also used by Ctrl+S / Ctrl+L")
+    parser.add_argument("--bridge", metavar="ADDRESS", nargs="?", const=BRIDGE_ADDRESS, default=None,
+                        help="let external controllers fly the drone over socket (host:port or unix:PATH)")
+    parser.add_argument("--mapping", metavar="RESOLUTION", nargs="?", type=float, const=MAP_RESOLUTION, default=None,
+                        help="build occupancy grid map with given cell size [m] from laser measurements and draw it")
+    args = parser.parse_args()
+
     # Initialize Environment
     env = Environment()
 
     # Initialize Obstacles
     obstacles = Obstacles(env)
+    # A map file which does not exist yet is only used for saving with Ctrl+S
+    if args.map is not None:
+        obstacles.map_path = args.map
+        if os.path.exists(args.map):
+            obstacles.load_map()
 
     # Initialize Drone
     drone = Drone(env)
 
+    # Map the world seen by the lasers, if wanted. A new world (map loaded or obstacles reset) gets a new empty map
+    # covering its bounds.
+    if args.mapping is not None:
+        def create_mapper(bounds):
+            drone.mapper = OccupancyGrid(bounds, args.mapping)
+        create_mapper(env.camera.world_bounds)
+        obstacles.world_bounds_callbacks.append(create_mapper)
+
+    # Record every physics step, if wanted
+    if args.record is not None:
+        drone.recorder = TelemetryRecorder(args.record, drone)
+
+    # Replay recorded flight, drone is then driven by the log instead of physics
+    replay = None
+    if args.replay is not None:
+        replay = Replay(FlightLog(args.replay), drone)
+
+    # Serve external controllers, their commands replace the keyboard while connected
+    bridge = None
+    if args.bridge is not None:
+        bridge = ControllerBridge(drone, args.bridge)
+        bridge.start()
+
+    # Initialize Profiler (timers cost nearly nothing when disabled)
+    profiler = FrameProfiler(enabled=args.profile is not None)
+
     # Main loop
     while env.running:
 
-        # Update all environment variables first (dt)
+        # Update all environment variables first (dt and number of physics steps in this frame)
         env.update()
+        profiler.frame()
 
         # for loop through the event queue
-        for event in pygame.event.get():
-            # Get Keys which are held down (easier for drone control)
-            pressed = pygame.key.get_pressed()
-            drone.check_user_input(pressed)
-            # Check environment related events
-            env.check_quit_event(event)
-            env.check_user_input(event)
-            # Check user input for editor mode
-            obstacles.check_user_input(event)
+        with profiler.stage("events"):
+            for event in pygame.event.get():
+                if replay is not None:
+                    replay.check_user_input(event)
+                elif bridge is None or bridge.n_clients == 0:
+                    # Get Keys which are held down (easier for drone control)
+                    pressed = pygame.key.get_pressed()
+                    drone.check_user_input(pressed)
+                # Check environment related events
+                env.check_quit_event(event)
+                env.check_user_input(event)
+                # Check user input for editor mode
+                obstacles.check_user_input(event)
+                env.camera.check_user_input(event)
+                profiler.check_user_input(event)
+
+        # Latest command of external controller, if any arrived since last frame
+        if bridge is not None:
+            bridge.apply_commands()
+
+        # Move view with drone before anything of the world is drawn
+        env.camera.follow(drone.draw_pos)
 
         # Draw environment
-        env.draw_environment()
+        with profiler.stage("draw_environment"):
+            env.draw_environment()
 
         # Draw all obstacles
-        obstacles.draw_all_obstacles()
+        with profiler.stage("draw_all_obstacles"):
+            obstacles.draw_all_obstacles()
+        if drone.mapper is not None:
+            with profiler.stage("draw_map"):
+                drone.mapper.draw(env)
 
-        # Only Update Drone, if game is in flying mode
-        if env.flying and not env.paused:
+        if replay is not None:
+            if not env.paused:
+                replay.update(env.frame_dt)
+        # Only Update Drone, if game is in flying mode, physics runs with fixed time step (several steps per frame)
+        for _ in range(env.n_substeps if replay is None else 0):
+            if not env.flying or env.paused:
+                break
             # Check for collision
-            drone.check_collision(obstacles.all_obstacles)
+            with profiler.stage("check_collision"):
+                drone.check_collision(obstacles.all_obstacles, obstacles.segment_grid)
             # Update Physics
-            drone.update_physics()
+            with profiler.stage("update_physics"):
+                drone.update_physics()
+        # Controllers only see the simulated time of the drone, which stands still while paused or not flying
+        if bridge is not None and env.flying and not env.paused:
+            bridge.publish(drone.IMU.timestamp)
 
         # Draw drone position and info
-        drone.update_draw()
+        with profiler.stage("update_draw"):
+            drone.update_draw()
+        if replay is not None:
+            replay.draw_info(env)
+        if bridge is not None:
+            bridge.draw_info(env)
+        profiler.draw_overlay(env)
 
         # Update the display
-        pygame.display.flip()
+        with profiler.stage("display_flip"):
+            pygame.display.flip()
+
+    if args.profile is not None:
+        profiler.dump(args.profile)
+    if drone.recorder is not None:
+        drone.recorder.close()
+    if bridge is not None:
+        bridge.close()
@@ -0,0 +1,186 @@
+""" File to generate large obstacle maps for stress testing
+
+All generators return walls compatible with Obstacles.all_obstacles (list of np.ndarrays with coordinates in [m])
+and keep a circular spawn region free of walls. The first wall is the outer border of the map, so the loaded world
+(see Obstacles.load_map) covers the whole map. Construction is vectorized, so maps with 100k segments are created
+in well under a second.
+Usage from command line: "python mapgen.py maze maze.npz --width 40 --height 40 --seed 1", then load the map with
+"python main.py --map maze.npz".
+"""
+
+import argparse
+import time
+import numpy as np
+import maps
+
+# Default spawn region, same as initial position of drone on default playground
+SPAWN = (4.0, 1.0)  # [m]
+SPAWN_RADIUS = 0.5  # [m]
+
+
+def maze(width, height, density=1.0, seed=None, spawn=SPAWN, spawn_radius=SPAWN_RADIUS, cell_size=0.6):
+    """
+    Maze on a grid (binary tree algorithm: every cell opens its wall to the north or east)
+
+    :param width: width of map [m]
+    :param height: height of map [m]
+    :param density: fraction of inner walls kept, 1 gives perfect maze, lower values open loops
+    :param seed: random seed
+    :param spawn: position [x, y] to keep free [m]
+    :param spawn_radius: radius of free region around spawn [m]
+    :param cell_size: width of maze passages [m]
+    :return: list of np.ndarrays (dim=2) containing coordinates of lines
+    """
+    rng = np.random.default_rng(seed)
+    n_x, n_y = int(width // cell_size), int(height // cell_size)
+    ix, iy = np.meshgrid(np.arange(n_x), np.arange(n_y), indexing='ij')
+    ix, iy = ix.ravel(), iy.ravel()
+    # Every cell opens either north or east, cells at top open east and cells at right border open north
+    open_north = rng.random(len(ix)) < 0.5
+    open_north[iy == n_y - 1] = False
+    open_north[ix == n_x - 1] = True
+    open_east = ~open_north
+    open_east[(ix == n_x - 1) & (iy == n_y - 1)] = False
+    # Wall on top of cell, if not opened to north and not at outer border
+    top = ~open_north & (iy < n_y - 1)
+    right = ~open_east & (ix < n_x - 1)
+    x0, y0 = ix * cell_size, iy * cell_size
+    top_walls = np.column_stack([x0[top], y0[top] + cell_size, x0[top] + cell_size, y0[top] + cell_size])
+    right_walls = np.column_stack([x0[right] + cell_size, y0[right], x0[right] + cell_size, y0[right] + cell_size])
+    segments = np.vstack([top_walls, right_walls])
+    segments = segments[rng.random(len(segments)) < density]
+    return [_border(n_x * cell_size, n_y * cell_size)] + \
+        _segments_to_polylines(segments[_far_from_spawn(segments.reshape(-1, 2, 2), spawn, spawn_radius)])
+
+
+def clutter(width, height, density=0.5, seed=None, spawn=SPAWN, spawn_radius=SPAWN_RADIUS, size=(0.1, 0.4)):
+    """
+    Randomly placed and rotated small boxes
+
+    :param width: width of map [m]
+    :param height: height of map [m]
+    :param density: number of boxes per square meter
+    :param seed: random seed
+    :param spawn: position [x, y] to keep free [m]
+    :param spawn_radius: radius of free region around spawn [m]
+    :param size: minimum and maximum edge length of boxes [m]
+    :return: list of np.ndarrays (dim=2) containing coordinates of closed lines
+    """
+    rng = np.random.default_rng(seed)
+    n_boxes = int(round(density * width * height))
+    center = rng.uniform([0, 0], [width, height], size=(n_boxes, 2))
+    half = rng.uniform(size[0], size[1], size=(n_boxes, 2)) / 2
+    angle = rng.uniform(0, np.pi, size=n_boxes)
+    return [_border(width, height)] + _boxes(center, half, angle, spawn, spawn_radius)
+
+
+def corridors(width, height, density=0.8, seed=None, spawn=SPAWN, spawn_radius=SPAWN_RADIUS, spacing=1.0,
+              piece=0.5):
+    """
+    Parallel horizontal corridors, walls are made of pieces with random gaps as doors
+
+    :param width: width of map [m]
+    :param height: height of map [m]
+    :param density: fraction of wall pieces kept, the rest are doors
+    :param seed: random seed
+    :param spawn: position [x, y] to keep free [m]
+    :param spawn_radius: radius of free region around spawn [m]
+    :param spacing: width of corridors [m]
+    :param piece: length of wall pieces [m]
+    :return: list of np.ndarrays (dim=2) containing coordinates of lines
+    """
+    rng = np.random.default_rng(seed)
+    wall_y = np.arange(spacing, height, spacing)
+    piece_x = np.arange(0, width, piece)
+    y, x = np.meshgrid(wall_y, piece_x, indexing='ij')
+    y, x = y.ravel(), x.ravel()
+    segments = np.column_stack([x, y, np.minimum(x + piece, width), y])
+    segments = segments[rng.random(len(segments)) < density]
+    return [_border(width, height)] + \
+        _segments_to_polylines(segments[_far_from_spawn(segments.reshape(-1, 2, 2), spawn, spawn_radius)])
+
+
+def city_blocks(width, height, density=0.5, seed=None, spawn=SPAWN, spawn_radius=SPAWN_RADIUS, block=1.5,
+                street=0.6):
+    """
+    Rectangular buildings on a regular block grid separated by streets
+
+    :param width: width of map [m]
+    :param height: height of map [m]
+    :param density: mean fraction of block area covered by building
+    :param seed: random seed
+    :param spawn: position [x, y] to keep free [m]
+    :param spawn_radius: radius of free region around spawn [m]
+    :param block: distance between centers of neighbouring blocks [m]
+    :param street: minimum width of streets [m]
+    :return: list of np.ndarrays (dim=2) containing coordinates of closed lines
+    """
+    rng = np.random.default_rng(seed)
+    cx, cy = np.meshgrid(np.arange(block / 2, width, block), np.arange(block / 2, height, block), indexing='ij')
+    center = np.column_stack([cx.ravel(), cy.ravel()])
+    max_half = (block - street) / 2
+    # Side lengths vary around the mean covered area
+    scale = np.sqrt(density) * rng.uniform(0.7, 1.3, size=center.shape)
+    half = np.clip(scale * max_half, 0.05, max_half)
+    return [_border(width, height)] + _boxes(center, half, np.zeros(len(center)), spawn, spawn_radius)
+
+
+def _border(width, height):
+    """
+    :return: closed line around the map from (0, 0) to (width, height) [m]
+    """
+    return np.array([[0, 0], [width, 0], [width, height], [0, height], [0, 0]], dtype=float)
+
+
+def _boxes(center, half, angle, spawn, spawn_radius):
+    corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1], [-1, -1]], dtype=float)
+    local = corners[None, :, :] * half[:, None, :]
+    c, s = np.cos(angle)[:, None], np.sin(angle)[:, None]
+    points = np.stack([c * local[:, :, 0] - s * local[:, :, 1],
+                       s * local[:, :, 0] + c * local[:, :, 1]], axis=2) + center[:, None, :]
+    return list(points[_far_from_spawn(points, spawn, spawn_radius)])
+
+
+def _far_from_spawn(polylines, spawn, spawn_radius):
+    """
+    :param polylines: np.ndarray with shape (n, k, 2), n polylines with k points each
+    :return: boolean mask of polylines without any segment closer than spawn_radius to spawn
+    """
+    a, b = polylines[:, :-1], polylines[:, 1:]
+    e = b - a
+    w = np.asarray(spawn, dtype=float) - a
+    l2 = np.sum(e * e, axis=2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        along = np.clip(np.where(l2 > 0, np.sum(w * e, axis=2) / l2, 0), 0, 1)
+    dist = np.linalg.norm(w - along[:, :, None] * e, axis=2)
+    return np.all(dist > spawn_radius, axis=1)
+
+
+def _segments_to_polylines(segments):
+    return list(segments.reshape(-1, 2, 2))
+
+
+GENERATORS = {'maze': maze, 'clutter': clutter, 'corridors': corridors, 'city': city_blocks}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate obstacle map for stress testing")
+    parser.add_argument("kind", choices=sorted(GENERATORS))
+    parser.add_argument("path", help="map file to write (.npz)")
+    parser.add_argument("--width", type=float, default=8.0, help="width of map [m]")
+    parser.add_argument("--height", type=float, default=8.0, help="height of map [m]")
+    parser.add_argument("--density", type=float, help="density of walls, meaning depends on kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn", type=float, nargs=2, default=SPAWN, help="position to keep free [m]")
+    parser.add_argument("--spawn-radius", type=float, default=SPAWN_RADIUS)
+    args = parser.parse_args()
+
+    kwargs = {'seed': args.seed, 'spawn': args.spawn, 'spawn_radius': args.spawn_radius}
+    if args.density is not None:
+        kwargs['density'] = args.density
+    start = time.perf_counter()
+    walls = GENERATORS[args.kind](args.width, args.height, **kwargs)
+    duration = time.perf_counter() - start
+    maps.save_map(args.path, walls)
+    print("{} walls with {} segments generated in {:.3f} s".format(
+        len(walls), sum(len(coords) - 1 for coords in walls), duration))
@@ -0,0 +1,207 @@
+""" File to build an occupancy grid map from the laser measurements of the drone"""
+
+import pygame
+import numpy as np
+from obstacles import LAYER_MARGIN
+
+# Mapping settings
+MAP_RESOLUTION = 0.05  # Edge length of one grid cell [m] | Default: 0.05
+MAP_MAX_CELLS = 2 ** 22  # Upper limit of cells, resolution is coarsened for large worlds (5 B per cell) | Default: 2 ** 22
+LOG_ODDS_OCCUPIED = 0.85  # Log-odds added to the cell a laser ends in | Default: 0.85
+LOG_ODDS_FREE = -0.4  # Log-odds added to cells a laser passes through | Default: -0.4
+LOG_ODDS_MIN = -4.0  # Log-odds are clamped, so the map can still change its mind | Default: -4.0
+LOG_ODDS_MAX = 4.0  # | Default: 4.0
+RAY_STEP = 0.5  # Distance between samples along a laser w.r.t. cell size | Default: 0.5
+TILE_SIZE = 64  # Edge length of render tiles [cells], only tiles with changed cells are redrawn | Default: 64
+MAP_ALPHA = 160  # Opacity of cells known for sure, unknown cells are transparent | Default: 160
+MAP_FREE_COLOR = (120, 170, 255)  # | Default: (120, 170, 255)
+MAP_OCCUPIED_COLOR = (30, 30, 30)  # | Default: (30, 30, 30)
+
+
+class OccupancyGrid:
+    def __init__(self, bounds, resolution=MAP_RESOLUTION, max_cells=MAP_MAX_CELLS):
+        """
+        Log-odds occupancy grid with fixed size, log-odds 0 means unknown, > 0 occupied and < 0 free.
+        Connect it with "drone.mapper = OccupancyGrid(bounds)", then every new Laser (and Lidar) measurement is added.
+
+        :param bounds: mapped part of world [x_min, y_min, x_max, y_max] in [m], lasers beyond it are cut off
+        :param resolution: edge length of one cell [m]
+        :param max_cells: upper limit of cells, resolution is coarsened if needed, so memory stays bounded
+        """
+        self.bounds = np.array(bounds, dtype=float)
+        size = self.bounds[2:4] - self.bounds[0:2]
+        self.resolution = max(resolution, float(np.sqrt(size[0] * size[1] / max_cells)))
+        self.nx, self.ny = np.maximum(np.ceil(size / self.resolution - 1e-9), 1).astype(int)
+        # Row index is y, column index is x, row 0 at y_min
+        self.log_odds = np.zeros((self.ny, self.nx), dtype=np.float32)
+        self.hit_mask = np.zeros(self.nx * self.ny, dtype=bool)  # Scratch array for update, always all False
+        self.n_updates = 0
+        self.last_logged = {}  # Measurement unit -> number of its measurements already added
+
+        # Rendering, one pixel per cell in pygame orientation (top row is y_max)
+        self.surface = None
+        self.dirty_tiles = np.ones((-(-self.ny // TILE_SIZE), -(-self.nx // TILE_SIZE)), dtype=bool)
+        self.revision = 0  # Incremented with every change of cells, so the scaled layer can detect changes
+        self.layer = None  # Cells around the view scaled to screen resolution
+        self.layer_rect = np.zeros(4)  # Part of world the layer was created for [x_min, y_min, x_max, y_max] in [m]
+        self.layer_corner = np.zeros(2)  # Top left corner of layer [m]
+        self.layer_scale = 0  # Pixels per meter of layer
+        self.layer_revision = -1  # Revision of cells the layer shows
+
+    def reset(self):
+        self.log_odds[:] = 0
+        self.dirty_tiles[:] = True
+        self.revision += 1
+
+    def probabilities(self):
+        """
+        :return: occupancy probability of all cells, np.ndarray with shape (ny, nx)
+        """
+        return 1 / (1 + np.exp(-self.log_odds))
+
+    def cells_of(self, points):
+        """
+        :param points: np.ndarray with shape (N, 2) in [m]
+        :return: flat cell indices (row * nx + column), -1 for points outside the grid
+        """
+        return self._flat_cells((points[:, 0] - self.bounds[0]) / self.resolution,
+                                (points[:, 1] - self.bounds[1]) / self.resolution)
+
+    def _flat_cells(self, x, y):
+        """
+        :param x: x coordinates in cell units w.r.t. lower left corner of grid
+        :param y: y coordinates in cell units w.r.t. lower left corner of grid
+        :return: flat cell indices, -1 outside the grid
+        """
+        ix = np.floor(x).astype(np.int64)
+        iy = np.floor(y).astype(np.int64)
+        inside = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        return np.where(inside, iy * self.nx + ix, -1)
+
+    def integrate(self, drone):
+        """
+        Add measurements the Laser (and Lidar) of the drone logged since the last call, call once per physics step.
+        Laser measurements are placed at the drone pose of this step, LiDAR beams at the pose each beam was fired at.
+
+        :param drone: drone with measurement units
+        """
+        for unit in (drone.Laser, drone.Lidar):
+            if unit is None or self.last_logged.get(unit, 0) == unit.n_logged:
+                continue
+            self.last_logged[unit] = unit.n_logged
+            meas = unit.get_current_meas()
+            pos, psi = (unit.meas_pos, unit.meas_psi) if unit is drone.Lidar else (drone.pos, drone.psi)
+            self.update(pos, psi + unit.beam_angles, meas[1:len(unit.beam_angles) + 1], unit.max_range)
+
+    def update(self, pos, angles, ranges, max_range):
+        """
+        March along all lasers at once: cells passed are made more likely free, cells a laser ends in more likely
+        occupied. Only touched cells are changed.
+
+        :param pos: position [x, y] of all lasers or np.ndarray with shape (N, 2) with one position per laser [m]
+        :param angles: laser angles in navigation frame [rad], angle 0 points along the y-axis
+        :param ranges: measured ranges [m], np.nan without hit
+        :param max_range: maximum range of lasers [m], lasers without hit mark cells free up to here. Noisy hits
+            beyond it are still hits, clipped to max_range.
+        """
+        angles = np.asarray(angles, dtype=float)
+        ranges = np.asarray(ranges, dtype=float)
+        directions = np.column_stack([-np.sin(angles), np.cos(angles)])
+        pos = np.broadcast_to(np.asarray(pos, dtype=float), directions.shape)
+        hit = ~np.isnan(ranges)
+        length = np.where(hit, np.clip(ranges, 0, max_range), max_range)
+
+        # Samples every RAY_STEP cells along all lasers, laser by laser in one flat array, in cell units
+        origin = (pos - self.bounds[0:2]) / self.resolution
+        n_samples = np.ceil(length / (self.resolution * RAY_STEP)).astype(np.int64)
+        distance = (np.arange(n_samples.sum()) - np.repeat(np.cumsum(n_samples) - n_samples, n_samples)) * RAY_STEP
+        free = self._flat_cells(np.repeat(origin[:, 0], n_samples) + np.repeat(directions[:, 0], n_samples) * distance,
+                                np.repeat(origin[:, 1], n_samples) + np.repeat(directions[:, 1], n_samples) * distance)
+        # Neighbouring samples mostly share a cell, drop these repetitions early
+        if len(free):
+            free = free[np.concatenate([[True], free[1:] != free[:-1]])]
+        free = free[free >= 0]
+        occupied = self.cells_of(pos[hit] + directions[hit] * length[hit, None])
+        occupied = occupied[occupied >= 0]
+        # Cells with a hit are not cleared by other lasers of the same measurement
+        self.hit_mask[occupied] = True
+        free = free[~self.hit_mask[free]]
+        self.hit_mask[occupied] = False
+
+        # Cells may appear several times, each new value is computed from the old one, so it is applied only once
+        cells = self.log_odds.reshape(-1)
+        cells[free] = np.maximum(cells[free] + LOG_ODDS_FREE, LOG_ODDS_MIN)
+        cells[occupied] = np.minimum(cells[occupied] + LOG_ODDS_OCCUPIED, LOG_ODDS_MAX)
+        touched = np.concatenate([free, occupied])
+        if len(touched):
+            self.dirty_tiles[touched // self.nx // TILE_SIZE, touched % self.nx // TILE_SIZE] = True
+            self.revision += 1
+        self.n_updates += 1
+
+    def refresh_tiles(self):
+        """
+        Redraw dirty tiles of the cell surface (one pixel per cell)
+        """
+        if self.surface is None:
+            self.surface = pygame.Surface((self.nx, self.ny), pygame.SRCALPHA)
+        rgb = pygame.surfarray.pixels3d(self.surface)
+        alpha = pygame.surfarray.pixels_alpha(self.surface)
+        for tile_y, tile_x in np.argwhere(self.dirty_tiles):
+            r0, c0 = tile_y * TILE_SIZE, tile_x * TILE_SIZE
+            r1, c1 = min(r0 + TILE_SIZE, self.ny), min(c0 + TILE_SIZE, self.nx)
+            # Surface is indexed [x, y] with y pointing down
+            p = 1 / (1 + np.exp(-self.log_odds[r0:r1, c0:c1][::-1].T))
+            rgb[c0:c1, self.ny - r1:self.ny - r0] = np.where((p > 0.5)[:, :, None], MAP_OCCUPIED_COLOR, MAP_FREE_COLOR)
+            alpha[c0:c1, self.ny - r1:self.ny - r0] = (np.abs(2 * p - 1) * MAP_ALPHA).astype(np.uint8)
+        # Release surface locks before blitting
+        del rgb, alpha
+        self.dirty_tiles[:] = False
+
+    def draw(self, env):
+        """
+        Draw map on playground. Like the obstacle layer, the visible cells are scaled once for an area reaching beyond
+        the view and only scaled again, when cells changed, the zoom changed or the view left the area.
+
+        :param env: environment to draw on
+        """
+        if env.headless:
+            return
+        camera = env.camera
+        view = camera.visible_rect()
+        if self.layer_revision != self.revision or self.layer_scale != camera.scale or \
+                np.any(view[0:2] < self.layer_rect[0:2]) or np.any(view[2:4] > self.layer_rect[2:4]):
+            if np.any(self.dirty_tiles):
+                self.refresh_tiles()
+            self.create_layer(env)
+        if self.layer is None:
+            return
+        corner = env.mysys_to_pygame(self.layer_corner)
+        env.screen.set_clip(env.playground_rect)
+        env.screen.blit(self.layer, np.round(corner))
+        env.screen.set_clip(None)
+
+    def create_layer(self, env):
+        """
+        Scale cells around the view to screen resolution
+
+        :param env: environment to draw on
+        """
+        camera = env.camera
+        view = camera.visible_rect()
+        margin = (view[2:4] - view[0:2]) * LAYER_MARGIN
+        self.layer_rect = np.concatenate([view[0:2] - margin, view[2:4] + margin])
+        self.layer_scale = camera.scale
+        self.layer_revision = self.revision
+        # Whole cells covering the layer area, clipped to the grid
+        c0, r0 = np.maximum(np.floor((self.layer_rect[0:2] - self.bounds[0:2]) / self.resolution).astype(int), 0)
+        c1, r1 = np.minimum(np.ceil((self.layer_rect[2:4] - self.bounds[0:2]) / self.resolution).astype(int),
+                            [self.nx, self.ny])
+        if c1 <= c0 or r1 <= r0:
+            self.layer = None
+            return
+        cells = self.surface.subsurface(pygame.Rect(c0, self.ny - r1, c1 - c0, r1 - r0))
+        pixels_per_cell = self.resolution * self.layer_scale
+        size = (max(1, int(round((c1 - c0) * pixels_per_cell))), max(1, int(round((r1 - r0) * pixels_per_cell))))
+        self.layer = pygame.transform.scale(cells, size)
+        # World coordinates of top left corner of layer [m]
+        self.layer_corner = self.bounds[0:2] + np.array([c0, r1]) * self.resolution
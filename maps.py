@@ -0,0 +1,72 @@
+""" File to save and load obstacle maps
+
+A map is a .npz file containing the walls as polylines (all points in one array plus start offsets) and the
+precompiled flat segment array with bounding boxes and normals, ready for collision and laser code.
+Usage from command line: "python maps.py info map.npz"
+"""
+
+import argparse
+import numpy as np
+
+MAP_VERSION = 1
+
+
+def compile_map(polylines):
+    """
+    :param polylines: list of np.ndarrays (dim=2) containing coordinates of lines [m]
+    :return: dict with all arrays stored in a map file
+    """
+    polylines = [np.asarray(coords, dtype=float).reshape(-1, 2) for coords in polylines]
+    lengths = np.array([len(coords) for coords in polylines], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    points = np.concatenate(polylines) if polylines else np.zeros((0, 2))
+    # Segments connect consecutive points of the same polyline only
+    is_start = np.ones(len(points), dtype=bool)
+    is_start[offsets[1:] - 1] = False
+    starts = np.nonzero(is_start)[0]
+    segments = np.hstack([points[starts], points[starts + 1]]) if len(starts) else np.zeros((0, 4))
+    bboxes = np.hstack([np.minimum(segments[:, 0:2], segments[:, 2:4]),
+                        np.maximum(segments[:, 0:2], segments[:, 2:4])])  # [x_min, y_min, x_max, y_max]
+    direction = segments[:, 2:4] - segments[:, 0:2]
+    length = np.linalg.norm(direction, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normals = np.where(length[:, None] > 0, np.column_stack([-direction[:, 1], direction[:, 0]]) / length[:, None],
+                           0)  # Left hand side unit normal
+    return {'version': np.array(MAP_VERSION), 'points': points, 'offsets': offsets, 'segments': segments,
+            'bboxes': bboxes, 'normals': normals}
+
+
+def save_map(path, polylines):
+    """
+    :param path: file path (.npz)
+    :param polylines: list of np.ndarrays (dim=2) containing coordinates of lines [m]
+    """
+    np.savez(path, **compile_map(polylines))
+
+
+def load_map(path):
+    """
+    :param path: file path (.npz)
+    :return: dict with points, offsets, segments, bboxes and normals (see compile_map) and polylines as list of
+        views into points
+    """
+    with np.load(path) as data:
+        if int(data['version']) != MAP_VERSION:
+            raise ValueError("Unsupported map version {}".format(int(data['version'])))
+        map_data = {key: data[key] for key in data.files}
+    offsets = map_data['offsets'].tolist()
+    map_data['polylines'] = [map_data['points'][start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    return map_data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect obstacle map files")
+    parser.add_argument("command", choices=["info"])
+    parser.add_argument("path")
+    args = parser.parse_args()
+    info = load_map(args.path)
+    print("{}: {} walls, {} segments".format(args.path, len(info['polylines']), len(info['segments'])))
+    if len(info['segments']):
+        low = info['bboxes'][:, 0:2].min(axis=0)
+        high = info['bboxes'][:, 2:4].max(axis=0)
+        print("Bounds: x {:.2f} .. {:.2f} m, y {:.2f} .. {:.2f} m".format(low[0], high[0], low[1], high[1]))
@@ -0,0 +1,48 @@
+""" File to handle noise of artificial measurements"""
+
+import numpy as np
+
+
+class NoiseModel:
+    def __init__(self, rng=None, uniform_perc=0.0, gauss_perc=0.0, gauss_std=0.0, bias=0.0, dropout=0.0,
+                 quantization=0.0):
+        """
+        Independent noise for every channel, generated in bulk from one numpy random generator.
+        All noise parameters are scalars or arrays broadcastable to the channels (last dimension of data).
+
+        :param rng: numpy.random.Generator, same seed gives same noise
+        :param uniform_perc: relative uniform noise, value is scaled by random factor between 1 - perc .. 1 + perc
+        :param gauss_perc: standard deviation of relative gaussian noise
+        :param gauss_std: standard deviation of absolute gaussian noise
+        :param bias: constant offset added to every value
+        :param dropout: probability of a value to be lost (returned as np.nan)
+        :param quantization: resolution values are rounded to, 0 for no rounding
+        """
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.uniform_perc = np.asarray(uniform_perc, dtype=float)
+        self.gauss_perc = np.asarray(gauss_perc, dtype=float)
+        self.gauss_std = np.asarray(gauss_std, dtype=float)
+        self.bias = np.asarray(bias, dtype=float)
+        self.dropout = np.asarray(dropout, dtype=float)
+        self.quantization = np.asarray(quantization, dtype=float)
+
+    def apply(self, data):
+        """
+        Put noise on data, one call for all channels and optionally many drones or samples at once
+
+        :param data: array with shape (..., n_channels)
+        :return: np.array data with noise on it
+        """
+        data = np.asarray(data, dtype=float)
+        noisy = data + self.bias
+        if np.any(self.uniform_perc):
+            noisy = noisy + self.rng.uniform(-1, 1, size=data.shape) * self.uniform_perc * data
+        if np.any(self.gauss_perc) or np.any(self.gauss_std):
+            noisy = noisy + self.rng.standard_normal(size=data.shape) * (self.gauss_perc * np.abs(data)
+                                                                         + self.gauss_std)
+        if np.any(self.quantization):
+            quantization = np.where(self.quantization > 0, self.quantization, 1)
+            noisy = np.where(self.quantization > 0, np.round(noisy / quantization) * quantization, noisy)
+        if np.any(self.dropout):
+            noisy = np.where(self.rng.random(size=data.shape) < self.dropout, np.nan, noisy)
+        return noisy
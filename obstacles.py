@@ -2,49 +2,90 @@
 
 import pygame
 import numpy as np
+from tools.segment_grid import SegmentGrid
+import maps
+
+# Settings for obstacles:
+GRID_CELL_SIZE = 0.5  # Cell size of spatial index for obstacle segments [m] | Default: 0.5
+MAP_PATH = "map.npz"  # File to save and load map with Ctrl+S and Ctrl+L in editor mode | Default: "map.npz"
+LAYER_MARGIN = 0.5  # Cached obstacle drawing reaches beyond view by this fraction of view size per side | Default: 0.5
 
 
 class Obstacles:
     def __init__(self, environment):
         self.env = environment
-        self.base_wall = np.array(
-            [[0, 0],
-             [self.env.PLAYGROUND_WIDTH/self.env.m_to_pxl, 0],
-             [self.env.PLAYGROUND_WIDTH/self.env.m_to_pxl, self.env.SCREEN_HEIGHT/self.env.m_to_pxl],
-             [0, self.env.SCREEN_HEIGHT/self.env.m_to_pxl],
-             [0, 0]]  # in [m]
-        )
-
-        self.all_obstacles = [self.base_wall]
+        # Outer boundaries of the world, by default exactly the playground
+        self.default_world_bounds = self.env.camera.world_bounds.copy()
+        self.base_wall = None
+        self.all_obstacles = []
+        # Spatial index of all obstacle segments for collision and laser queries
+        self.segment_grid = SegmentGrid(GRID_CELL_SIZE)
+        self.n_base_segments = 4  # The first segments in the grid belong to the base wall
+        # Called with the new bounds whenever the outer boundaries change (map loaded or obstacles reset)
+        self.world_bounds_callbacks = []
 
-        # Temporary list of coordinates during editor mode
+        # Temporary list of coordinates during editing in my coordinate system [m]
         self.temp_coord_list = []
+        self.map_path = MAP_PATH
+
+        # Cached surface with all committed obstacles around the view, rebuilt after invalidation, zoom or when the
+        # view leaves the covered part of the world
+        self.obstacle_layer = None
+        self.layer_rect = np.zeros(4)  # Part of world covered by layer [x_min, y_min, x_max, y_max] in [m]
+        self.layer_scale = 0  # Pixels per meter of layer
+        self.vertex_pixels = np.zeros((256, 2))  # Reused buffer for segment end points in pixels, grows by doubling
+        self.reset_obstacles()
 
     def draw_all_obstacles(self):
-        for i, obstacle in enumerate(self.all_obstacles):
-            # Change line width for first outer boundaries
-            if i == 0:
-                line_width = 4
-            else:
-                line_width = 2
-            for point in obstacle:
-                pygame.draw.circle(self.env.screen, self.env.BLACK, self.env.mysys_to_pygame(point), 2)
-            obstacle = self.env.mysys_to_pygame(obstacle)  # Convert from metre to pxl and coord origin
-            pygame.draw.lines(surface=self.env.screen,
-                              color=self.env.BLACK,
-                              closed=False,
-                              points=obstacle,
-                              width=line_width)
+        camera = self.env.camera
+        view = camera.visible_rect()
+        if self.obstacle_layer is None or self.layer_scale != camera.scale or \
+                np.any(view[0:2] < self.layer_rect[0:2]) or np.any(view[2:4] > self.layer_rect[2:4]):
+            self.create_obstacle_layer()
+        corner = self.env.mysys_to_pygame(self.layer_rect[[0, 3]])
+        self.env.screen.set_clip(self.env.playground_rect)
+        self.env.screen.blit(self.obstacle_layer, np.round(corner))
         # Draw temporary coord list, which are in the making during editing
-        if len(self.temp_coord_list) >= 2:
-            pygame.draw.lines(surface=self.env.screen,
-                              color=self.env.BLUE,
-                              closed=False,
-                              points=self.temp_coord_list,
-                              width=2)
-        # Care: Points are still in pygame system, since temporary list
-        for point in self.temp_coord_list:
-            pygame.draw.circle(self.env.screen, self.env.BLUE, point, 2)
+        if self.temp_coord_list:
+            temp_points = self.env.mysys_to_pygame(np.array(self.temp_coord_list))
+            if len(temp_points) >= 2:
+                pygame.draw.lines(surface=self.env.screen,
+                                  color=self.env.BLUE,
+                                  closed=False,
+                                  points=temp_points,
+                                  width=2)
+            for point in temp_points:
+                pygame.draw.circle(self.env.screen, self.env.BLUE, point, 2)
+        self.env.screen.set_clip(None)
+
+    def create_obstacle_layer(self):
+        """
+        Render all obstacles close to the view once on a transparent (color key) surface to be blitted every frame.
+        Only segments found in the segment grid around the view are drawn, so the cost does not depend on map size.
+        """
+        camera = self.env.camera
+        view = camera.visible_rect()
+        margin = (view[2:4] - view[0:2]) * LAYER_MARGIN
+        self.layer_rect = np.concatenate([view[0:2] - margin, view[2:4] + margin])
+        self.layer_scale = camera.scale
+        size = np.ceil((self.layer_rect[2:4] - self.layer_rect[0:2]) * self.layer_scale).astype(int)
+        self.obstacle_layer = pygame.Surface(size.tolist()).convert()
+        self.obstacle_layer.fill(self.env.WHITE)
+        self.obstacle_layer.set_colorkey(self.env.WHITE, pygame.RLEACCEL)
+
+        ids = self.segment_grid.query_box(*self.layer_rect)
+        vertices = self.segment_grid.segments[ids].reshape(-1, 2)
+        if len(vertices) > len(self.vertex_pixels):
+            self.vertex_pixels = np.zeros((max(2 * len(self.vertex_pixels), len(vertices)), 2))
+        # Convert all end points from metre to pxl at once, then relative to top left corner of layer
+        pixels = self.env.mysys_to_pygame(vertices, out=self.vertex_pixels[:len(vertices)])
+        pixels -= self.env.mysys_to_pygame(self.layer_rect[[0, 3]])
+        # Change line width for first outer boundaries
+        line_widths = np.where(ids < self.n_base_segments, 4, 2)
+        for (x1, y1, x2, y2), line_width in zip(pixels.reshape(-1, 4).tolist(), line_widths.tolist()):
+            pygame.draw.line(self.obstacle_layer, self.env.BLACK, (x1, y1), (x2, y2), line_width)
+            pygame.draw.circle(self.obstacle_layer, self.env.BLACK, (x1, y1), 2)
+            pygame.draw.circle(self.obstacle_layer, self.env.BLACK, (x2, y2), 2)
 
     def check_user_input(self, event):
         # Pygame internal variables for left and right mouse click
@@ -54,22 +95,91 @@ class Obstacles:
         if self.env.editor:
             # Add coordinate temporary to list
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == LEFT and self.env.is_over_playground(mouse_pos):
-                self.temp_coord_list.append(list(mouse_pos))
+                self.temp_coord_list.append(self.env.pygame_to_mysys(mouse_pos))
             # Add all points to coordinates when user uses right click or hits return in editor mode
             if (event.type == pygame.MOUSEBUTTONDOWN and event.button == RIGHT and self.env.is_over_playground(mouse_pos)) or \
                     (event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN):
                 if len(self.temp_coord_list) >= 2:
                     # Append temporary list of coordinates to all obstacles in my coordinate system
-                    self.all_obstacles.append(self.env.pygame_to_mysys(np.array(self.temp_coord_list)))
+                    self.add_obstacle(np.array(self.temp_coord_list))
                 # Reset temp coord list
                 self.temp_coord_list = []
             if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 self.temp_coord_list = []
+            # Save and load map
+            if event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL:
+                if event.key == pygame.K_s:
+                    self.save_map()
+                if event.key == pygame.K_l:
+                    self.load_map()
         else:
             self.temp_coord_list = []
         if self.env.editor_reset:
             self.env.editor_reset = False
             self.reset_obstacles()
 
+    def add_obstacle(self, coords):
+        """
+        Add a wall to all obstacles
+
+        :param coords: np.ndarray (dim=2) containing coordinates of line in my coordinate system [m]
+        """
+        self.all_obstacles.append(coords)
+        self.segment_grid.insert_polyline(coords)
+        self.obstacle_layer = None
+
     def reset_obstacles(self):
+        self.set_world_bounds(self.default_world_bounds)
+
+    def set_world_bounds(self, bounds):
+        """
+        Remove all walls and surround the world with new outer boundaries
+
+        :param bounds: [x_min, y_min, x_max, y_max] in [m]
+        """
+        x_min, y_min, x_max, y_max = bounds
+        self.base_wall = np.array(
+            [[x_min, y_min],
+             [x_max, y_min],
+             [x_max, y_max],
+             [x_min, y_max],
+             [x_min, y_min]]  # in [m]
+        )
         self.all_obstacles = [self.base_wall]
+        self.segment_grid.clear()
+        self.segment_grid.insert_polyline(self.base_wall)
+        self.env.camera.set_world_bounds(bounds)
+        self.obstacle_layer = None
+        for callback in self.world_bounds_callbacks:
+            callback(bounds)
+
+    def save_map(self, path=None):
+        """
+        Save all walls except outer boundaries to map file
+
+        :param path: file path (.npz), default is self.map_path
+        """
+        maps.save_map(path or self.map_path, self.all_obstacles[1:])
+
+    def load_map(self, path=None):
+        """
+        Replace all walls with walls of map file, segments are taken precompiled from file. The outer boundaries are
+        enlarged to enclose the whole map.
+
+        :param path: file path (.npz), default is self.map_path
+        :return: True if map was loaded, False if file could not be read (current walls are kept)
+        """
+        path = path or self.map_path
+        try:
+            map_data = maps.load_map(path)
+        except (OSError, ValueError, KeyError) as error:
+            print("Could not load map {}: {}".format(path, error))
+            return False
+        bounds = self.default_world_bounds.copy()
+        if len(map_data['bboxes']):
+            bounds[0:2] = np.minimum(bounds[0:2], map_data['bboxes'][:, 0:2].min(axis=0))
+            bounds[2:4] = np.maximum(bounds[2:4], map_data['bboxes'][:, 2:4].max(axis=0))
+        self.set_world_bounds(bounds)
+        self.all_obstacles.extend(map_data['polylines'])
+        self.segment_grid.insert_segments(map_data['segments'])
+        return True
@@ -0,0 +1,182 @@
+""" File to measure, where the time of each frame goes"""
+
+import csv
+import functools
+import json
+import time
+import pygame
+import numpy as np
+
+# Profiler settings
+PROFILE_WINDOW = 300  # Number of recent samples per stage used for statistics | Default: 300
+OVERLAY_REFRESH = 0.25  # Time between updates of overlay text [s] | Default: 0.25
+
+
+class _NullTimer:
+    """ Timer doing nothing, returned while profiler is disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class StageTimer:
+    def __init__(self, window):
+        """
+        Timer for one stage keeping the last samples in a circular buffer
+
+        :param window: number of samples kept
+        """
+        self.samples = np.zeros(window)  # [s]
+        self.head = 0
+        self.n_samples = 0  # Total number of samples ever recorded
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.add(time.perf_counter() - self.start)
+        return False
+
+    def add(self, duration):
+        self.samples[self.head] = duration
+        self.head = (self.head + 1) % len(self.samples)
+        self.n_samples += 1
+
+    def stats(self):
+        """
+        :return: dict with mean, p95 and max over window in [ms] and total number of samples
+        """
+        recent = self.samples[:min(self.n_samples, len(self.samples))] * 1000
+        if len(recent) == 0:
+            return {'mean': 0.0, 'p95': 0.0, 'max': 0.0, 'n': 0}
+        return {'mean': float(np.mean(recent)),
+                'p95': float(np.percentile(recent, 95)),
+                'max': float(np.max(recent)),
+                'n': self.n_samples}
+
+
+class FrameProfiler:
+    def __init__(self, enabled=False, window=PROFILE_WINDOW):
+        """
+        Collect rolling timing statistics of named stages of the main loop
+
+        :param enabled: timers only measure, when enabled, otherwise they cost nearly nothing
+        :param window: number of recent samples per stage used for statistics
+        """
+        self.enabled = enabled
+        self.window = window
+        self.timers = {}  # Stage name -> StageTimer, in order of first use
+        self.frame_timer = StageTimer(window)
+        self.last_frame = None
+        self.show_overlay = False
+        self.overlay_texts = []
+        self.last_overlay_update = 0.0
+
+    def stage(self, name):
+        """
+        Context manager to time one stage, e.g. "with profiler.stage('update_physics'): ..."
+
+        :param name: name of stage
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = StageTimer(self.window)
+        return timer
+
+    def timed(self, name=None):
+        """
+        Decorator to time every call of a function as stage
+
+        :param name: name of stage, default is function name
+        """
+        def decorator(func):
+            stage_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def frame(self):
+        """
+        Call once per frame to measure total frame time and frames per second
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.frame_timer.add(now - self.last_frame)
+        self.last_frame = now
+
+    def fps(self):
+        mean_frame = self.frame_timer.stats()['mean']
+        return 1000 / mean_frame if mean_frame > 0 else 0.0
+
+    def stats(self):
+        """
+        :return: dict stage name -> statistics (see StageTimer.stats), total frame time as "frame"
+        """
+        all_stats = {name: timer.stats() for name, timer in self.timers.items()}
+        all_stats['frame'] = self.frame_timer.stats()
+        return all_stats
+
+    def check_user_input(self, event):
+        """
+        F3 toggles overlay with stage breakdown in playground
+
+        :param event: pygame input event
+        """
+        if self.enabled and event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.show_overlay = not self.show_overlay
+
+    def draw_overlay(self, env):
+        """
+        Draw FPS and mean/p95/max per stage in [ms] in upper left corner of playground
+
+        :param env: environment to draw on
+        """
+        if not (self.enabled and self.show_overlay):
+            return
+        # Refresh text only a few times per second to keep it readable and the text cache small
+        now = time.perf_counter()
+        if now - self.last_overlay_update >= OVERLAY_REFRESH:
+            self.last_overlay_update = now
+            self.overlay_texts = ["FPS: {:.0f}".format(self.fps())]
+            for name, timer in self.timers.items():
+                stats = timer.stats()
+                self.overlay_texts.append("{}: {:.2f} / {:.2f} / {:.2f} ms".format(
+                    name, stats['mean'], stats['p95'], stats['max']))
+        c = 70
+        for text in self.overlay_texts:
+            env.display_text(text, (10, c), 14, align='left')
+            c += 18
+
+    def dump(self, path):
+        """
+        Write statistics of all stages to file, format is chosen by ending (.csv or .json)
+
+        :param path: file path
+        """
+        all_stats = self.stats()
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['stage', 'mean_ms', 'p95_ms', 'max_ms', 'n'])
+                for name, stats in all_stats.items():
+                    writer.writerow([name, stats['mean'], stats['p95'], stats['max'], stats['n']])
+        else:
+            with open(path, 'w') as f:
+                json.dump({'fps': self.fps(), 'stages': all_stats}, f, indent=2)
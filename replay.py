@@ -0,0 +1,142 @@
+""" File to replay recorded flights without simulating them again"""
+
+import os
+import pygame
+import numpy as np
+from telemetry import read_header
+from tools.ray_cast import ray_directions
+
+
+class FlightLog:
+    def __init__(self, path):
+        """
+        Open telemetry file written by TelemetryRecorder, records are memory mapped and only read when accessed
+
+        :param path: file path
+        """
+        with open(path, 'rb') as f:
+            self.header, self.dtype, offset = read_header(f)
+        n_records = (os.path.getsize(path) - offset) // self.dtype.itemsize
+        if n_records == 0:
+            raise ValueError("Telemetry file {} contains no records".format(path))
+        self.records = np.memmap(path, dtype=self.dtype, mode='r', offset=offset, shape=(n_records,))
+        self.t = self.records['t']  # Memory mapped view on time column [s]
+
+    def __len__(self):
+        return len(self.records)
+
+
+class Replay:
+    def __init__(self, log, drone, speed=1.0):
+        """
+        Drive drone pose and laser visuals from a flight log instead of physics
+
+        :param log: FlightLog
+        :param drone: drone to show the recorded flight with
+        :param speed: playback speed factor
+        """
+        self.log = log
+        self.drone = drone
+        self.speed = speed
+        self.playing = True
+        self.index = 0
+        self.time = float(log.t[0])  # Current replay time [s]
+        self.apply()
+
+    def update(self, dt):
+        """
+        Advance replay by passed frame time, call once per frame
+
+        :param dt: frame time [s]
+        """
+        if self.playing:
+            self.seek(self.time + dt * self.speed)
+            if self.index == len(self.log) - 1:
+                self.playing = False
+
+    def seek(self, t):
+        """
+        Jump to last record at or before time t
+
+        :param t: replay time [s]
+        """
+        self.time = min(max(t, float(self.log.t[0])), float(self.log.t[-1]))
+        self.index = max(int(np.searchsorted(self.log.t, self.time, side='right')) - 1, 0)
+        self.apply()
+
+    def step(self, n_records):
+        """
+        Step forward or backward by number of records (physics steps), pauses replay
+
+        :param n_records: number of records, negative to step backward
+        """
+        self.playing = False
+        self.index = min(max(self.index + n_records, 0), len(self.log) - 1)
+        self.time = float(self.log.t[self.index])
+        self.apply()
+
+    def apply(self):
+        """
+        Set drone state of current record, so the drone drawing methods show it
+        """
+        rec = self.log.records[self.index]
+        drone = self.drone
+        drone.pos = np.array(rec['pos'])
+        drone.psi = float(rec['psi'])
+        drone.speed_nav = np.array(rec['speed_nav'])
+        drone.F = np.array(rec['F'])
+        drone.M = float(rec['M'])
+        drone.body_to_nav = np.array([[np.cos(drone.psi), -np.sin(drone.psi)],
+                                      [np.sin(drone.psi), np.cos(drone.psi)]])
+        # No interpolation between physics steps needed
+        drone.pos_prev = drone.pos
+        drone.psi_prev = drone.psi
+        # Laser visuals end at hit point or maximum range
+        laser_range = np.array(rec['laser_range'])
+        max_range = self.log.header['laser_max_range']
+        directions = ray_directions(drone.psi, len(laser_range))
+        drone.simulated_laser_range = laser_range
+        drone.simulated_laser_intercep_visual = drone.pos + directions * np.where(
+            np.isnan(laser_range), max_range, laser_range)[:, None]
+
+    def check_user_input(self, event):
+        """
+        Space: play/pause, Left/Right: step, Up/Down: double/half speed, Page Up/Down: +/- 10 s, Home/End: jump
+
+        :param event: pygame input event
+        """
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_SPACE:
+            if self.index == len(self.log) - 1:
+                self.seek(float(self.log.t[0]))
+            self.playing = not self.playing
+        elif event.key == pygame.K_RIGHT:
+            self.step(1)
+        elif event.key == pygame.K_LEFT:
+            self.step(-1)
+        elif event.key == pygame.K_UP:
+            self.speed *= 2
+        elif event.key == pygame.K_DOWN:
+            self.speed /= 2
+        elif event.key == pygame.K_PAGEUP:
+            self.seek(self.time + 10)
+        elif event.key == pygame.K_PAGEDOWN:
+            self.seek(self.time - 10)
+        elif event.key == pygame.K_HOME:
+            self.seek(float(self.log.t[0]))
+        elif event.key == pygame.K_END:
+            self.seek(float(self.log.t[-1]))
+
+    def draw_info(self, env):
+        """
+        Show replay time, speed and controls on top of playground
+
+        :param env: environment to draw on
+        """
+        state = "Playing" if self.playing else "Paused"
+        env.display_text("Replay {}: {:.2f} / {:.2f} s at {:g}x".format(state, self.time, float(self.log.t[-1]),
+                                                                        self.speed),
+                         (env.PLAYGROUND_WIDTH / 2, 20), 16)
+        env.display_text("Space: Play/Pause, Left/Right: Step, Up/Down: Speed, Page Up/Down: +/- 10 s",
+                         (env.PLAYGROUND_WIDTH / 2, 40), 14)
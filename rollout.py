@@ -0,0 +1,122 @@
+""" File to evaluate a controller over many scenarios in parallel headless simulations"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Avoid pygame greeting in every worker process
+from simulation import Simulation  # noqa: E402
+from environment import HEADLESS_DT  # noqa: E402
+
+
+class Scenario:
+    def __init__(self, obstacles=None, x0=None, y0=None, psi0=None, seed=0, duration=30.0):
+        """
+        Description of one episode
+
+        :param obstacles: list of np.ndarrays (dim=2) containing coordinates of lines [m] added to the base wall
+        :param x0: initial position in x [m], default as defined in Drone
+        :param y0: initial position in y [m], default as defined in Drone
+        :param psi0: initial yaw angle [rad], default as defined in Drone
+        :param seed: seed for measurement noise, same seed gives same episode
+        :param duration: maximum simulated time of episode [s]
+        """
+        self.obstacles = obstacles if obstacles is not None else []
+        self.x0 = x0
+        self.y0 = y0
+        self.psi0 = psi0
+        self.seed = seed
+        self.duration = duration
+
+
+def run_episode(controller, scenario, dt=HEADLESS_DT):
+    """
+    Fly one scenario headless until crash or end of duration
+
+    :param controller: picklable callable(drone) returning (F, M), applied with Drone.apply_forces every step
+    :param scenario: Scenario to fly
+    :param dt: fixed time step [s]
+    :return: dict with crash_time [s] (None without crash), distance_flown [m], laser_min_distance [m] (nan if no
+        laser hit anything) and sim_time [s]
+    """
+    sim = Simulation(dt=dt, seed=scenario.seed)
+    for coords in scenario.obstacles:
+        sim.obstacles.add_obstacle(np.asarray(coords, dtype=float))
+    drone = sim.drone
+    if scenario.x0 is not None:
+        drone.x0 = scenario.x0
+    if scenario.y0 is not None:
+        drone.y0 = scenario.y0
+    if scenario.psi0 is not None:
+        drone.psi0 = scenario.psi0
+    drone.reset_drone()
+
+    crash_time = None
+    distance_flown = 0.0
+    laser_min_distance = np.inf
+    n_steps = int(round(scenario.duration / dt))
+    for _ in range(n_steps):
+        F, M = controller(drone)
+        drone.apply_forces(F, M)
+        pos_before = drone.pos.copy()
+        if sim.step():
+            crash_time = sim.env.total_time
+            break
+        distance_flown += float(np.linalg.norm(drone.pos - pos_before))
+        ranges = drone.get_sim_laser_meas()
+        if not np.all(np.isnan(ranges)):
+            laser_min_distance = min(laser_min_distance, float(np.nanmin(ranges)))
+
+    return {'crash_time': crash_time,
+            'distance_flown': distance_flown,
+            'laser_min_distance': laser_min_distance if np.isfinite(laser_min_distance) else np.nan,
+            'sim_time': sim.env.total_time}
+
+
+def _run_episode_args(args):
+    return run_episode(*args)
+
+
+def run_rollouts(controller, scenarios, n_workers=None, dt=HEADLESS_DT):
+    """
+    Fan scenarios out across a process pool of headless simulations
+
+    :param controller: picklable callable(drone) returning (F, M), e.g. a module level function
+    :param scenarios: list of Scenario
+    :param n_workers: number of processes, default number of CPUs, 1 runs everything in this process
+    :param dt: fixed time step [s]
+    :return: list of episode metrics (see run_episode) in same order as scenarios
+    """
+    tasks = [(controller, scenario, dt) for scenario in scenarios]
+    if n_workers == 1:
+        return [_run_episode_args(task) for task in tasks]
+    n_workers = n_workers or os.cpu_count() or 1
+    # Few big chunks per worker keep inter-process overhead small compared to the episodes
+    chunksize = max(1, len(tasks) // (4 * n_workers))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(_run_episode_args, tasks, chunksize=chunksize))
+
+
+def hover_forward(drone):
+    """
+    Example controller for run_rollouts and Simulation.run, called in-process with the Drone: fly forward and brake,
+    if the front laser measures an obstacle closer than 1 m
+
+    :param drone: drone to control
+    :return: tuple (F, M)
+    """
+    front = drone.get_sim_laser_meas()[0]
+    if not np.isnan(front) and front < 1.0:
+        return [0, -0.5], 0
+    return [0, 0.5], 0
+
+
+if __name__ == "__main__":
+    scenarios = [Scenario(psi0=psi0, seed=i, duration=20.0)
+                 for i, psi0 in enumerate(np.linspace(0, 2 * np.pi, 32, endpoint=False))]
+    start = time.perf_counter()
+    results = run_rollouts(hover_forward, scenarios)
+    duration = time.perf_counter() - start
+    n_crashed = sum(result['crash_time'] is not None for result in results)
+    print("{} episodes in {:.2f} s, {} crashed".format(len(results), duration, n_crashed))
@@ -0,0 +1,145 @@
+""" File to simulate laser sensors, synchronously or on a worker thread for drawing"""
+
+import threading
+import numpy as np
+from tools.ray_cast import polylines_to_segments, ray_directions, ray_segment_intersection, ray_fan_intersection
+
+# LiDAR settings
+LIDAR_INTENSITY_RANGE = 1.0  # Range up to which returned intensity is not weakened by distance [m] | Default: 1.0
+
+
+def simulate_lasers(pos, psi, n_laser, max_range, all_line_obs, segment_grid=None):
+    """
+    True laser ranges of evenly spaced lasers around the drone
+
+    :param pos: position [x, y] of drone [m]
+    :param psi: yaw angle of drone [rad]
+    :param n_laser: number of lasers
+    :param max_range: maximum range of laser measurement [m]
+    :param all_line_obs: list of np.ndarrays (dim=2) containing coordinates of lines
+    :param segment_grid: optional SegmentGrid of the obstacles, only segments along the lasers are checked when given
+    :return: tuple (ranges, visual), ranges with np.nan without hit and end points of lasers for visualization (hit
+        point or maximum range) with shape (n_laser, 2)
+    """
+    directions = ray_directions(psi, n_laser)
+    if segment_grid is not None:
+        segments = segment_grid.segments[segment_grid.query_rays(pos, directions, max_range)]
+    else:
+        segments = polylines_to_segments(all_line_obs)
+    laser_dis, _ = ray_segment_intersection(pos, directions, max_range, segments)
+    # Lasers without hit end at maximum range for visualization
+    # TODO: Check, what a laser would return, when out of laser range
+    hit = laser_dis < max_range
+    visual = pos + directions * np.where(hit, laser_dis, max_range)[:, None]
+    return np.where(hit, laser_dis, np.nan), visual
+
+
+def simulate_lidar(pos, angles, max_range, all_line_obs, segment_grid=None):
+    """
+    True ranges and intensities of many beams with one common origin, all beams are solved in one batch and every
+    segment only against the beams in its direction (see ray_fan_intersection)
+
+    Intensity follows a simple diffuse reflection: cosine of the angle between beam and wall normal, weakened with the
+    squared distance beyond LIDAR_INTENSITY_RANGE, so it lies between 0 .. 1.
+
+    :param pos: position [x, y] of drone [m]
+    :param angles: beam angles in navigation frame [rad], angle 0 points along the y-axis
+    :param max_range: maximum range of beams [m]
+    :param all_line_obs: list of np.ndarrays (dim=2) containing coordinates of lines
+    :param segment_grid: optional SegmentGrid of the obstacles, only segments within max_range are checked when given
+    :return: tuple (ranges, intensities) with shape (n_beams,), range np.nan and intensity 0 without hit
+    """
+    angles = np.asarray(angles, dtype=float)
+    if segment_grid is not None:
+        # Many beams sweep the whole circle, so collecting its cells once is cheaper than walking every beam
+        segments = segment_grid.segments[segment_grid.query_circle(pos, max_range)]
+    else:
+        segments = polylines_to_segments(all_line_obs)
+    distance, idx = ray_fan_intersection(pos, angles, max_range, segments)
+    hit = idx >= 0
+    ranges = np.where(hit, distance, np.nan)
+    intensities = np.zeros(len(angles))
+    if np.any(hit):
+        seg = segments[idx[hit]]
+        edge = seg[:, 2:4] - seg[:, 0:2]
+        # |direction x edge| / |edge| is the cosine between beam and wall normal, direction is [-sin, cos]
+        cos_incidence = np.abs(-np.sin(angles[hit]) * edge[:, 1] - np.cos(angles[hit]) * edge[:, 0]) \
+            / np.hypot(edge[:, 0], edge[:, 1])
+        falloff = np.minimum(1.0, (LIDAR_INTENSITY_RANGE / np.maximum(distance[hit], 1e-9)) ** 2)
+        intensities[hit] = cos_incidence * falloff
+    return ranges, intensities
+
+
+class LaserWorker:
+    def __init__(self):
+        """
+        Simulate lasers on a background thread. The render loop hands over a snapshot of pose and obstacles with
+        request() and reads the last finished result with latest(), so it never waits for the computation.
+        Results are double buffered: the worker writes into the back buffer and swaps it with the front buffer when
+        finished, latest() copies from the front buffer.
+        """
+        self.front = (np.zeros(0), np.zeros((0, 2)))  # (ranges, visual) of last finished request
+        self.back = (np.zeros(0), np.zeros((0, 2)))
+        self.n_finished = 0  # Number of finished requests
+        self.pending = None  # Latest request not started yet, older ones are replaced
+        self.grid_snapshot = None  # Copy of segment grid used by worker, renewed when the original changes
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, name="LaserWorker", daemon=True)
+        self.thread.start()
+
+    def request(self, pos, psi, n_laser, max_range, all_line_obs, segment_grid=None):
+        """
+        Ask for lasers at given pose, returns immediately (parameters see simulate_lasers)
+        """
+        if segment_grid is not None and (self.grid_snapshot is None
+                                         or self.grid_snapshot.revision != segment_grid.revision):
+            self.grid_snapshot = segment_grid.copy()
+        grid = self.grid_snapshot if segment_grid is not None else None
+        request = (np.array(pos, dtype=float), float(psi), n_laser, max_range, list(all_line_obs), grid)
+        with self.condition:
+            self.pending = request
+            self.condition.notify()
+
+    def latest(self, ranges_out=None, visual_out=None):
+        """
+        Copy result of last finished request
+
+        :param ranges_out: optional array to copy ranges into, shape (n_laser,)
+        :param visual_out: optional array to copy laser end points into, shape (n_laser, 2)
+        :return: tuple (ranges, visual), None before the first request is finished
+        """
+        with self.condition:
+            if self.n_finished == 0:
+                return None
+            ranges, visual = self.front
+            if ranges_out is None or len(ranges_out) != len(ranges):
+                return ranges.copy(), visual.copy()
+            ranges_out[:] = ranges
+            visual_out[:] = visual
+            return ranges_out, visual_out
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                request, self.pending = self.pending, None
+            ranges, visual = simulate_lasers(*request)
+            back_ranges, back_visual = self.back
+            if len(back_ranges) != len(ranges):
+                back_ranges, back_visual = np.zeros_like(ranges), np.zeros_like(visual)
+            back_ranges[:] = ranges
+            back_visual[:] = visual
+            with self.condition:
+                self.back = self.front
+                self.front = (back_ranges, back_visual)
+                self.n_finished += 1
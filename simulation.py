@@ -0,0 +1,65 @@
+""" Headless simulation core to run drone physics without display as fast as possible"""
+
+import time
+from environment import Environment, HEADLESS_DT
+from obstacles import Obstacles
+from drone import Drone
+
+
+class Simulation:
+    def __init__(self, dt=HEADLESS_DT, seed=None):
+        """
+        Display-free counterpart of the main loop in main.py, physics and sensors are stepped with fixed time step
+
+        :param dt: fixed time step [s]
+        :param seed: seed for measurement noise of drone
+        """
+        self.env = Environment(headless=True, dt=dt)
+        self.obstacles = Obstacles(self.env)
+        self.drone = Drone(self.env, seed=seed)
+        self.n_steps = 0
+        self.n_crashes = 0
+
+    def step(self):
+        """
+        Advance simulation by one fixed time step in the same order as the interactive main loop
+
+        :return: True, if drone crashed during this step (drone is reset to initial position then)
+        """
+        self.env.update()
+        crashed = self.drone.check_collision(self.obstacles.all_obstacles, self.obstacles.segment_grid)
+        if crashed:
+            # Nobody is there to continue, so do not stay paused
+            self.env.paused = False
+            self.n_crashes += 1
+        self.drone.update_physics()
+        self.n_steps += 1
+        return crashed
+
+    def run(self, n_steps, controller=None):
+        """
+        Run multiple steps, optionally with a controller steering the drone
+
+        :param n_steps: number of steps
+        :param controller: callable(drone) returning (F, M) used with Drone.apply_forces before each step
+        :return: number of crashes during run
+        """
+        crashes_before = self.n_crashes
+        for _ in range(n_steps):
+            if controller is not None:
+                F, M = controller(self.drone)
+                self.drone.apply_forces(F, M)
+            self.step()
+        return self.n_crashes - crashes_before
+
+
+if __name__ == "__main__":
+    # Quick throughput check
+    sim = Simulation()
+    sim.drone.apply_forces(F=[0.2, 0.5], M=0.05)
+    n = 10000
+    start = time.perf_counter()
+    crashes = sim.run(n)
+    duration = time.perf_counter() - start
+    print("{} steps ({:.0f} s simulated) in {:.2f} s: {:.0f} steps/s, {} crashes".format(
+        n, n * sim.env.fixed_dt, duration, n / duration, crashes))
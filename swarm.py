@@ -0,0 +1,131 @@
+""" File to handle physics of many drones at once with structure-of-arrays state"""
+
+import numpy as np
+from drone import RADIUS, DRONE_MASS, DAMP_TRANSLATIONAL, DAMP_ROTATIONAL
+
+
+class DroneSwarm:
+    def __init__(self, environment, n_drones, x0=None, y0=None, psi0=None):
+        """
+        Batched version of the Drone physics, state of all drones is kept in arrays with first dimension n_drones.
+        Same frames and equations as in Drone, see there for details.
+
+        :param environment: environment providing dt
+        :param n_drones: number of drones
+        :param x0: initial position in x [m], scalar or array with shape (n_drones,), default like Drone
+        :param y0: initial position in y [m], scalar or array with shape (n_drones,), default like Drone
+        :param psi0: initial yaw angle [rad], scalar or array with shape (n_drones,)
+        """
+        # Make environment accessible
+        self.env = environment
+        self.n_drones = n_drones
+
+        # --------- Settings ---------
+        self.radius = RADIUS  # [m]
+        self.drone_mass = DRONE_MASS  # [kg]
+        self.damp_t = DAMP_TRANSLATIONAL  # translational damping [kg/s]
+        self.damp_r = DAMP_ROTATIONAL  # rotational damping [kg*m^2/s]
+
+        # Initial position, same default as for a single drone
+        if x0 is None:
+            x0 = (self.env.PLAYGROUND_WIDTH / 2) / self.env.m_to_pxl
+        if y0 is None:
+            y0 = 100 / self.env.m_to_pxl
+        if psi0 is None:
+            psi0 = 0.0
+        self.x0 = np.broadcast_to(np.asarray(x0, dtype=float), (n_drones,)).copy()
+        self.y0 = np.broadcast_to(np.asarray(y0, dtype=float), (n_drones,)).copy()
+        self.psi0 = np.broadcast_to(np.asarray(psi0, dtype=float), (n_drones,)).copy()
+
+        # --------- Rest of init (DO NOT CHANGE) ---------
+        # Navigation frame values
+        self.pos = np.zeros((n_drones, 2))  # x and y
+        self.psi = np.zeros(n_drones)  # Yaw angle [rad]
+        self.speed_nav = np.zeros((n_drones, 2))
+
+        # State, forces and dynamic values in BODY FRAME!!
+        self.r = np.zeros(n_drones)  # Yaw Rate [rad/s]
+        self.r_dot = np.zeros(n_drones)  # Yaw Acc [rad/s^2]
+        self.speed = np.zeros((n_drones, 2))  # u, v [m/s]
+        self.acc = np.zeros((n_drones, 2))  # u_dot, v_dot [m/s^2]
+        self.F = np.zeros((n_drones, 2))  # F_xb and F_yb (total forces)
+        self.F_drag = np.zeros((n_drones, 2))  # F_drag_xb, F_drag_yb
+        self.F_user = np.zeros((n_drones, 2))  # User force input
+        self.M = np.zeros(n_drones)  # total moment [Nm]
+        self.M_drag = np.zeros(n_drones)
+        self.M_user = np.zeros(n_drones)
+        self.J = 0.5*self.drone_mass*self.radius**2  # Inertia formula for thin circular disk
+
+        # Preallocated buffers for rotation between body and navigation frame
+        self._cos = np.zeros(n_drones)
+        self._sin = np.zeros(n_drones)
+        self._tmp = np.zeros(n_drones)
+
+        self.reset()
+
+    def update_physics(self):
+        self.calculate_forces()
+        self.equation_of_motion()
+
+    def calculate_forces(self):
+        # Calculate Drag Forces
+        np.multiply(self.speed, -self.damp_t, out=self.F_drag)
+        np.multiply(self.r, -self.damp_r, out=self.M_drag)
+        # Calculate total forces
+        np.add(self.F_user, self.F_drag, out=self.F)
+        np.add(self.M_user, self.M_drag, out=self.M)
+        # Calculate accelerations
+        np.divide(self.F, self.drone_mass, out=self.acc)
+        np.divide(self.M, self.J, out=self.r_dot)
+
+    def equation_of_motion(self):
+        dt = self.env.dt
+        c, s, tmp = self._cos, self._sin, self._tmp
+        np.cos(self.psi, out=c)
+        np.sin(self.psi, out=s)
+        # simple semi-implicit-euler used here, body_to_nav = [[c, -s], [s, c]] written out per component
+        acc_x, acc_y = self.acc[:, 0], self.acc[:, 1]
+        v_x, v_y = self.speed_nav[:, 0], self.speed_nav[:, 1]
+        np.multiply(c, acc_x, out=tmp)
+        tmp -= s * acc_y
+        tmp *= dt
+        v_x += tmp
+        np.multiply(s, acc_x, out=tmp)
+        tmp += c * acc_y
+        tmp *= dt
+        v_y += tmp
+        # Rotation matrix is orthonormal, so nav_to_body is its transpose
+        u, v = self.speed[:, 0], self.speed[:, 1]
+        np.multiply(c, v_x, out=u)
+        u += s * v_y
+        np.multiply(c, v_y, out=v)
+        v -= s * v_x
+        self.pos += self.speed_nav * dt
+        self.r += self.r_dot * dt
+        self.psi += self.r * dt
+        np.mod(self.psi, 2 * np.pi, out=self.psi)  # Values are always between 0 and 2 pi
+
+    def apply_forces(self, F, M):
+        """
+        Batched interface to apply forces on all drones, same as Drone.apply_forces
+
+        :param F: Translational Force as array with shape (n_drones, 2) in body frame [N]
+        :param M: Rotational Force as array with shape (n_drones,) [Nm]
+        """
+        self.F_user[:] = F
+        self.M_user[:] = M
+
+    def reset(self, mask=None):
+        """
+        Reset drones to their initial state
+
+        :param mask: optional boolean array or indices selecting drones to reset, default all
+        """
+        if mask is None:
+            mask = slice(None)
+        self.pos[mask, 0] = self.x0[mask]
+        self.pos[mask, 1] = self.y0[mask]
+        self.psi[mask] = self.psi0[mask]
+        for state in (self.speed_nav, self.r, self.r_dot, self.speed, self.acc, self.F, self.F_drag, self.F_user,
+                      self.M, self.M_drag, self.M_user):
+            state[mask] = 0
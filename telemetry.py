@@ -0,0 +1,158 @@
+""" File to record drone state and measurements of a flight to a compact binary log
+
+File format (all little endian):
+    8 bytes magic b'DRONETLM', uint32 format version, uint32 header length,
+    JSON header (numpy dtype of records and flight settings) padded with spaces to a multiple of 64 bytes,
+    followed by fixed size records of that dtype appended in chunks, one record per physics step.
+"""
+
+import json
+import queue
+import struct
+import threading
+import time
+import numpy as np
+
+MAGIC = b'DRONETLM'
+VERSION = 1
+HEADER_ALIGN = 64
+
+# Recorder settings
+CHUNK_SIZE = 1024  # Number of records collected before they are handed to the writer thread | Default: 1024
+MAX_CHUNKS = 16  # Maximum number of chunks waiting for the writer, further chunks are dropped | Default: 16
+
+
+def record_dtype(drone):
+    """
+    :param drone: drone to record
+    :return: numpy structured dtype of one record, each measurement unit gets its latest sample and a flag, whether
+        this sample was logged in this step
+    """
+    fields = [('t', '<f8'), ('pos', '<f8', (2,)), ('psi', '<f8'), ('speed_nav', '<f8', (2,)),
+              ('F', '<f8', (2,)), ('M', '<f8'), ('laser_range', '<f8', (drone.n_laser,))]
+    for unit in drone.measurement_units:
+        name = type(unit).__name__
+        fields.append((name + '_new', 'u1'))
+        fields.append((name, '<f8', (unit.measurements.shape[1],)))
+    return np.dtype(fields)
+
+
+def write_header(f, dtype, info):
+    """
+    :param f: binary file opened for writing
+    :param dtype: numpy dtype of records
+    :param info: dict with further flight settings
+    """
+    header = dict(info, descr=np.lib.format.dtype_to_descr(dtype))
+    header_bytes = json.dumps(header).encode('utf-8')
+    prefix_len = len(MAGIC) + 8
+    padding = -(prefix_len + len(header_bytes)) % HEADER_ALIGN
+    header_bytes += b' ' * padding
+    f.write(MAGIC + struct.pack('<II', VERSION, len(header_bytes)) + header_bytes)
+
+
+def read_header(f):
+    """
+    :param f: binary file opened for reading at start of file
+    :return: tuple (header dict, numpy dtype of records, byte offset of first record)
+    """
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError("Not a telemetry file")
+    version, header_len = struct.unpack('<II', f.read(8))
+    if version != VERSION:
+        raise ValueError("Unsupported telemetry version {}".format(version))
+    header = json.loads(f.read(header_len).decode('utf-8'))
+    dtype = np.lib.format.descr_to_dtype([tuple(field) for field in header['descr']])
+    return header, dtype, len(MAGIC) + 8 + header_len
+
+
+class TelemetryRecorder:
+    def __init__(self, path, drone, chunk_size=CHUNK_SIZE, max_chunks=MAX_CHUNKS):
+        """
+        Stream drone state and measurements of every physics step to an append-only binary file.
+        Records are collected in chunks and written by a background thread, so recording never waits for the disk.
+        Connect it with "drone.recorder = TelemetryRecorder(path, drone)" and call close() at the end.
+
+        :param path: file path
+        :param drone: drone to record
+        :param chunk_size: number of records per chunk
+        :param max_chunks: maximum number of chunks waiting to be written, further chunks are dropped and counted
+        """
+        self.drone = drone
+        self.dtype = record_dtype(drone)
+        self.chunk_size = chunk_size
+        self.chunk = np.zeros(chunk_size, dtype=self.dtype)
+        self.n_in_chunk = 0
+        self.time = 0.0  # Recorded flight time [s]
+        self.n_records = 0
+        self.n_dropped_chunks = 0
+        self.units = [(type(unit).__name__, unit) for unit in drone.measurement_units]
+        self.last_logged = {name: unit.n_logged for name, unit in self.units}
+
+        self.file = open(path, 'wb')
+        write_header(self.file, self.dtype, {'n_laser': drone.n_laser,
+                                             'laser_max_range': drone.laser_max_range,
+                                             'radius': drone.radius,
+                                             'units': [name for name, _ in self.units],
+                                             'created': time.time()})
+        self.file.flush()
+        self.chunks = queue.Queue(maxsize=max_chunks)
+        self.writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self.writer.start()
+
+    def record(self):
+        """
+        Add current state of drone as one record, call once per physics step
+        """
+        self.time += self.drone.env.dt
+        rec = self.chunk[self.n_in_chunk]
+        rec['t'] = self.time
+        rec['pos'] = self.drone.pos
+        rec['psi'] = self.drone.psi
+        rec['speed_nav'] = self.drone.speed_nav
+        rec['F'] = self.drone.F
+        rec['M'] = self.drone.M
+        rec['laser_range'] = self.drone.get_sim_laser_meas()
+        for name, unit in self.units:
+            measurements, head = unit.get_raw_meas()
+            rec[name] = measurements[head]
+            rec[name + '_new'] = unit.n_logged != self.last_logged[name]
+            self.last_logged[name] = unit.n_logged
+        self.n_in_chunk += 1
+        self.n_records += 1
+        if self.n_in_chunk == self.chunk_size:
+            self._submit()
+
+    def flush(self):
+        """
+        Hand all collected records to the writer thread, e.g. on crash or reset (does not wait for the disk)
+        """
+        if self.n_in_chunk > 0:
+            self._submit()
+
+    def close(self):
+        """
+        Write all remaining records and close file, waits for writer thread
+        """
+        self.flush()
+        self.chunks.put(None)
+        self.writer.join()
+        self.file.close()
+
+    def _submit(self):
+        try:
+            self.chunks.put_nowait(self.chunk[:self.n_in_chunk])
+        except queue.Full:
+            self.n_dropped_chunks += 1
+        # Start new chunk, the submitted one now belongs to the writer thread
+        self.chunk = np.zeros(self.chunk_size, dtype=self.dtype)
+        self.n_in_chunk = 0
+
+    def _write_chunks(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            self.file.write(chunk.tobytes())
+            self.file.flush()
@@ -0,0 +1,158 @@
+import numpy as np
+
+# Maximum number of ray/segment pairs solved in one broadcast, bigger problems are split into segment chunks to keep
+# the temporary arrays small
+CHUNK_ELEMENTS = 2 ** 20
+# Widening of the angle covered by a segment, so rays exactly through an end point are not lost by rounding [rad]
+ANGLE_TOLERANCE = 1e-9
+
+
+def polylines_to_segments(polylines):
+    """
+    Pack a list of polylines into one contiguous segment array
+
+    :param polylines: list of np.ndarrays (dim=2) containing coordinates of lines
+    :return: np.ndarray with shape (N, 4) and rows [x1, y1, x2, y2]
+    """
+    segments = [np.hstack([coords[:-1], coords[1:]]) for coords in polylines if len(coords) >= 2]
+    if not segments:
+        return np.zeros((0, 4))
+    return np.ascontiguousarray(np.vstack(segments), dtype=float)
+
+
+def ray_directions(psi, n_rays, fov=2 * np.pi, offset=0.0):
+    """
+    Unit direction vectors of evenly spaced rays in navigation frame, angle 0 points along the body y-axis
+
+    :param psi: yaw angle of body [rad]
+    :param n_rays: number of rays
+    :param fov: field of view covered by the rays [rad], 2 pi means full circle without duplicated ray
+    :param offset: angle of first ray w.r.t. body frame [rad]
+    :return: np.ndarray with shape (n_rays, 2)
+    """
+    angles = psi + offset + np.arange(n_rays) * (fov / n_rays)
+    return np.column_stack([-np.sin(angles), np.cos(angles)])
+
+
+def ray_segment_intersection(origins, directions, max_range, segments):
+    """
+    Solve every ray against every segment at once and return the closest hit for each ray
+
+    :param origins: ray origins, np.ndarray with shape (2,) for one common origin or (R, 2)
+    :param directions: unit direction vectors, np.ndarray with shape (R, 2)
+    :param max_range: maximum length of each ray
+    :param segments: np.ndarray with shape (N, 4) and rows [x1, y1, x2, y2]
+    :return: tuple (distance, index) with np.ndarrays of shape (R,), distance is np.inf and index -1 without hit
+    """
+    origins = np.asarray(origins, dtype=float)
+    directions = np.asarray(directions, dtype=float)
+    n_rays = len(directions)
+    closest = np.full(n_rays, np.inf)
+    closest_idx = np.full(n_rays, -1)
+    if n_rays == 0 or len(segments) == 0:
+        return closest, closest_idx
+
+    # Origins and directions as column vectors to broadcast against all segments
+    ox = np.broadcast_to(origins[..., 0], (n_rays,))[:, None]
+    oy = np.broadcast_to(origins[..., 1], (n_rays,))[:, None]
+    dx = directions[:, 0:1]
+    dy = directions[:, 1:2]
+
+    chunk = max(1, CHUNK_ELEMENTS // n_rays)
+    for start in range(0, len(segments), chunk):
+        t = _ray_distance(ox, oy, dx, dy, segments[start:start + chunk], max_range)
+        idx = np.argmin(t, axis=1)
+        t_min = t[np.arange(n_rays), idx]
+        better = t_min < closest
+        closest[better] = t_min[better]
+        closest_idx[better] = idx[better] + start
+
+    return closest, closest_idx
+
+
+def ray_fan_intersection(origin, angles, max_range, segments):
+    """
+    Closest hit of many rays with one common origin. Every segment is only solved against the rays within the angle
+    it covers seen from the origin, so the work grows with the number of actual ray/segment pairs instead of
+    rays times segments.
+
+    :param origin: common ray origin [x, y]
+    :param angles: ray angles in navigation frame [rad], angle 0 points along the y-axis (see ray_directions)
+    :param max_range: maximum length of each ray
+    :param segments: np.ndarray with shape (N, 4) and rows [x1, y1, x2, y2]
+    :return: tuple (distance, index) with np.ndarrays of shape (R,), distance is np.inf and index -1 without hit
+    """
+    origin = np.asarray(origin, dtype=float)
+    angles = np.asarray(angles, dtype=float)
+    n_rays = len(angles)
+    closest = np.full(n_rays, np.inf)
+    closest_idx = np.full(n_rays, -1)
+    if n_rays == 0 or len(segments) == 0:
+        return closest, closest_idx
+
+    # Angles of segment end points, then the covered interval [start, start + width] with width <= pi
+    a1 = np.arctan2(origin[0] - segments[:, 0], segments[:, 1] - origin[1])
+    a2 = np.arctan2(origin[0] - segments[:, 2], segments[:, 3] - origin[1])
+    delta = (a2 - a1 + np.pi) % (2 * np.pi) - np.pi
+    start = (np.where(delta >= 0, a1, a2) - ANGLE_TOLERANCE) % (2 * np.pi)
+    width = np.abs(delta) + 2 * ANGLE_TOLERANCE
+
+    # Rays sorted by angle and repeated once shifted by 2 pi, so intervals wrapping around 0 are contiguous
+    ray_order = np.argsort(angles % (2 * np.pi))
+    sorted_angles = angles[ray_order] % (2 * np.pi)
+    sorted_angles = np.concatenate([sorted_angles, sorted_angles + 2 * np.pi])
+    first = np.searchsorted(sorted_angles, start, side='left')
+    last = np.minimum(np.searchsorted(sorted_angles, start + width, side='right'), first + n_rays)
+    counts = last - first
+    n_pairs = int(counts.sum())
+    if n_pairs == 0:
+        return closest, closest_idx
+
+    # All ray/segment pairs to solve
+    pair_seg = np.repeat(np.arange(len(segments)), counts)
+    pair_pos = np.arange(n_pairs) - np.repeat(np.cumsum(counts) - counts - first, counts)
+    pair_ray = ray_order[pair_pos % n_rays]
+
+    t = _ray_distance(origin[0], origin[1], -np.sin(angles[pair_ray]), np.cos(angles[pair_ray]),
+                      segments[pair_seg], max_range)
+    valid = t < np.inf
+    t, pair_ray, pair_seg = t[valid], pair_ray[valid], pair_seg[valid]
+
+    # Closest hit per ray: sort by ray, then distance, and take the first pair of every ray
+    order = np.lexsort((t, pair_ray))
+    rays, first_pair = np.unique(pair_ray[order], return_index=True)
+    closest[rays] = t[order][first_pair]
+    closest_idx[rays] = pair_seg[order][first_pair]
+    return closest, closest_idx
+
+
+def ray_segment_pairs(origins, directions, max_range, segments):
+    """
+    Solve ray i against segment i only, e.g. for candidate pairs found by a SegmentGrid
+
+    :param origins: ray origins, np.ndarray with shape (P, 2)
+    :param directions: unit direction vectors, np.ndarray with shape (P, 2)
+    :param max_range: maximum length of each ray
+    :param segments: np.ndarray with shape (P, 4) and rows [x1, y1, x2, y2]
+    :return: np.ndarray with shape (P,), distance to hit or np.inf without hit
+    """
+    return _ray_distance(origins[:, 0], origins[:, 1], directions[:, 0], directions[:, 1], segments, max_range)
+
+
+def _ray_distance(ox, oy, dx, dy, seg, max_range):
+    """
+    Distance along rays to segments, all ray values broadcast against the segment columns
+
+    :return: distance or np.inf without hit
+    """
+    ex = seg[:, 2] - seg[:, 0]
+    ey = seg[:, 3] - seg[:, 1]
+    wx = seg[:, 0] - ox
+    wy = seg[:, 1] - oy
+    # Solve origin + t * direction = p1 + u * (p2 - p1) with cross products
+    denom = dx * ey - dy * ex
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (wx * ey - wy * ex) / denom
+        u = (wx * dy - wy * dx) / denom
+    valid = (denom != 0) & (t >= 0) & (t <= max_range) & (u >= 0) & (u <= 1)
+    return np.where(valid, t, np.inf)
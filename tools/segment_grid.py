@@ -0,0 +1,312 @@
+import math
+import numpy as np
+from tools.ray_cast import ray_segment_pairs
+
+# Segments with a bounding box covering up to this number of cells are added to all of these cells, longer ones are
+# traversed cell by cell
+MAX_BOX_CELLS = 4
+
+
+class SegmentGrid:
+    def __init__(self, cell_size):
+        """
+        Uniform grid in meters to look up obstacle segments close to a position, circle or ray
+
+        :param cell_size: edge length of one grid cell [m]
+        """
+        self.cell_size = cell_size
+        self.cells = {}  # (ix, iy) -> list of segment indices
+        self._segments = np.zeros((64, 4))  # Preallocated, grows by doubling
+        self.n_segments = 0
+        self.revision = 0  # Incremented with every change, so users of copies can detect outdated ones
+        self._compressed_cells = None  # Cells in compressed sparse row form for vectorized queries, built lazily
+
+    @property
+    def segments(self):
+        """
+        :return: np.ndarray view with shape (N, 4) and rows [x1, y1, x2, y2] of all inserted segments
+        """
+        return self._segments[:self.n_segments]
+
+    def clear(self):
+        self.cells = {}
+        self.n_segments = 0
+        self.revision += 1
+
+    def copy(self):
+        """
+        :return: independent SegmentGrid with same content, e.g. to be queried by another thread
+        """
+        grid = SegmentGrid(self.cell_size)
+        grid.cells = {cell: list(ids) for cell, ids in self.cells.items()}
+        grid._segments = self.segments.copy()
+        grid.n_segments = self.n_segments
+        grid.revision = self.revision
+        return grid
+
+    def insert_polyline(self, coords):
+        """
+        :param coords: np.ndarray (dim=2) containing coordinates of a line
+        """
+        if len(coords) >= 2:
+            self.insert_segments(np.hstack([coords[:-1], coords[1:]]))
+
+    def insert_segments(self, segments):
+        """
+        :param segments: np.ndarray with shape (N, 4) and rows [x1, y1, x2, y2]
+        """
+        segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+        n_new = len(segments)
+        if self.n_segments + n_new > len(self._segments):
+            capacity = max(2 * len(self._segments), self.n_segments + n_new)
+            grown = np.zeros((capacity, 4))
+            grown[:self.n_segments] = self.segments
+            self._segments = grown
+        self._segments[self.n_segments:self.n_segments + n_new] = segments
+        ids = np.arange(self.n_segments, self.n_segments + n_new)
+        self.n_segments += n_new
+        self.revision += 1
+
+        # Short segments are added to all cells of their bounding box at once (few cells more than necessary at most)
+        low = np.floor(np.minimum(segments[:, 0:2], segments[:, 2:4]) / self.cell_size).astype(np.int64)
+        high = np.floor(np.maximum(segments[:, 0:2], segments[:, 2:4]) / self.cell_size).astype(np.int64)
+        n_x = high[:, 0] - low[:, 0] + 1
+        n_cells = n_x * (high[:, 1] - low[:, 1] + 1)
+        short = n_cells <= MAX_BOX_CELLS
+        self._insert_boxes(ids[short], low[short], n_x[short], n_cells[short])
+
+        # Long segments only to cells they pass through
+        for i, (x1, y1, x2, y2) in zip(ids[~short].tolist(), segments[~short].tolist()):
+            length = math.hypot(x2 - x1, y2 - y1)
+            for cell in self._traverse(x1, y1, (x2 - x1) / length, (y2 - y1) / length, length):
+                self.cells.setdefault(cell, []).append(i)
+
+    def _insert_boxes(self, ids, low, n_x, n_cells):
+        if len(ids) == 0:
+            return
+        # One entry per segment and cell of its bounding box
+        entry_ids = np.repeat(ids, n_cells)
+        first_entry = np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        k = np.arange(len(entry_ids)) - first_entry
+        n_x = np.repeat(n_x, n_cells)
+        ix = np.repeat(low[:, 0], n_cells) + k % n_x
+        iy = np.repeat(low[:, 1], n_cells) + k // n_x
+        # Group entries by cell
+        order = np.lexsort((entry_ids, iy, ix))
+        ix, iy, entry_ids = ix[order], iy[order], entry_ids[order]
+        new_cell = np.ones(len(ix), dtype=bool)
+        new_cell[1:] = (ix[1:] != ix[:-1]) | (iy[1:] != iy[:-1])
+        starts = np.nonzero(new_cell)[0]
+        ends = np.append(starts[1:], len(ix)).tolist()
+        entry_ids = entry_ids.tolist()  # Slicing lists is much faster than np.split for many small groups
+        for cell, start, end in zip(zip(ix[starts].tolist(), iy[starts].tolist()), starts.tolist(), ends):
+            self.cells.setdefault(cell, []).extend(entry_ids[start:end])
+
+    def query_circle(self, center, radius):
+        """
+        :param center: circle center [x, y] in [m]
+        :param radius: circle radius [m]
+        :return: np.ndarray with indices of all segments in cells touched by the bounding box of the circle
+        """
+        return self.query_box(center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius)
+
+    def query_box(self, x_min, y_min, x_max, y_max):
+        """
+        :return: np.ndarray with indices of all segments in cells touched by the box [m]
+        """
+        ix_min, iy_min = self._cell_of(x_min, y_min)
+        ix_max, iy_max = self._cell_of(x_max, y_max)
+        if (ix_max - ix_min + 1) * (iy_max - iy_min + 1) > len(self.cells):
+            # Large box, looking at occupied cells only is cheaper
+            found = [ids for (ix, iy), ids in self.cells.items()
+                     if ix_min <= ix <= ix_max and iy_min <= iy <= iy_max]
+        else:
+            found = [self.cells[(ix, iy)]
+                     for ix in range(ix_min, ix_max + 1)
+                     for iy in range(iy_min, iy_max + 1)
+                     if (ix, iy) in self.cells]
+        return self._unique(found)
+
+    def query_ray(self, origin, direction, max_range):
+        """
+        :param origin: ray origin [x, y] in [m]
+        :param direction: unit direction vector of ray
+        :param max_range: length of ray [m]
+        :return: np.ndarray with indices of all segments in cells the ray passes through
+        """
+        return self.query_rays(origin, [direction], max_range)
+
+    def query_rays(self, origin, directions, max_range):
+        """
+        Same as query_ray for multiple rays with one common origin, each cell is only visited once
+
+        :param origin: ray origin [x, y] in [m]
+        :param directions: unit direction vectors, np.ndarray with shape (R, 2)
+        :param max_range: length of rays [m]
+        :return: np.ndarray with indices of all segments in cells any of the rays passes through
+        """
+        ox, oy = float(origin[0]), float(origin[1])
+        visited = set()
+        for dx, dy in np.asarray(directions, dtype=float).tolist():
+            visited.update(self._traverse(ox, oy, dx, dy, max_range))
+        return self._unique([self.cells[cell] for cell in visited if cell in self.cells])
+
+    def cast_rays(self, origins, directions, max_range):
+        """
+        Closest hit of many rays with own origins. All rays walk through the cells together like in query_rays, so
+        there is no Python loop over rays, and every ray stops after the cell containing its closest hit.
+
+        :param origins: ray origins, np.ndarray with shape (R, 2) in [m]
+        :param directions: unit direction vectors, np.ndarray with shape (R, 2)
+        :param max_range: length of rays [m]
+        :return: tuple (distance, index) with np.ndarrays of shape (R,), distance is np.inf and index -1 without hit
+        """
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float)
+        n_rays = len(origins)
+        distance = np.full(n_rays, np.inf)
+        index = np.full(n_rays, -1)
+        cs = self.cell_size
+        ix = np.floor(origins[:, 0] / cs).astype(np.int64)
+        iy = np.floor(origins[:, 1] / cs).astype(np.int64)
+        dx, dy = directions[:, 0], directions[:, 1]
+        step_x = np.where(dx > 0, 1, -1)
+        step_y = np.where(dy > 0, 1, -1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_max_x = np.where(dx != 0, ((ix + (dx > 0)) * cs - origins[:, 0]) / dx, np.inf)
+            t_max_y = np.where(dy != 0, ((iy + (dy > 0)) * cs - origins[:, 1]) / dy, np.inf)
+            t_delta_x = np.where(dx != 0, cs / np.abs(dx), np.inf)
+            t_delta_y = np.where(dy != 0, cs / np.abs(dy), np.inf)
+        active = np.arange(n_rays)
+        while len(active):
+            # Solve segments in current cell of every active ray
+            owner, ids = self._query_cell_pairs(np.arange(len(active)), ix, iy)
+            if len(ids):
+                rays = active[owner]
+                t = ray_segment_pairs(origins[rays], directions[rays], max_range, self.segments[ids])
+                np.minimum.at(distance, rays, t)
+                closest = (t == distance[rays]) & (t < np.inf)
+                index[rays[closest]] = ids[closest]
+            # Same decision as in _traverse for every active ray
+            along_x = t_max_x < t_max_y
+            t_next = np.where(along_x, t_max_x, t_max_y)
+            # Hits in later cells can not be closer than the exit of the current cell
+            go_on = (t_next <= max_range) & (distance[active] > t_next)
+            along_x, along_y = along_x[go_on], ~along_x[go_on]
+            active, ix, iy = active[go_on], ix[go_on], iy[go_on]
+            t_max_x, t_max_y = t_max_x[go_on], t_max_y[go_on]
+            step_x, step_y = step_x[go_on], step_y[go_on]
+            t_delta_x, t_delta_y = t_delta_x[go_on], t_delta_y[go_on]
+            ix = ix + np.where(along_x, step_x, 0)
+            iy = iy + np.where(along_y, step_y, 0)
+            t_max_x = t_max_x + np.where(along_x, t_delta_x, 0)
+            t_max_y = t_max_y + np.where(along_y, t_delta_y, 0)
+        return distance, index
+
+    def query_box_pairs(self, boxes):
+        """
+        Candidates of many boxes at once like query_box, without Python loop over boxes
+
+        :param boxes: np.ndarray with shape (B, 4) and rows [x_min, y_min, x_max, y_max] in [m]
+        :return: tuple (box_idx, ids) with box index and segment index of every candidate pair, a segment may appear
+            several times for one box
+        """
+        boxes = np.asarray(boxes, dtype=float)
+        low = np.floor(boxes[:, 0:2] / self.cell_size).astype(np.int64)
+        high = np.floor(boxes[:, 2:4] / self.cell_size).astype(np.int64)
+        n_x = high[:, 0] - low[:, 0] + 1
+        n_cells = n_x * (high[:, 1] - low[:, 1] + 1)
+        # One entry per box and cell of box
+        owner = np.repeat(np.arange(len(boxes)), n_cells)
+        k = np.arange(len(owner)) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        n_x = np.repeat(n_x, n_cells)
+        return self._query_cell_pairs(owner, np.repeat(low[:, 0], n_cells) + k % n_x,
+                                      np.repeat(low[:, 1], n_cells) + k // n_x)
+
+    def _query_cell_pairs(self, owner, ix, iy):
+        """
+        :param owner: index of query each cell belongs to
+        :param ix: cell indices in x
+        :param iy: cell indices in y
+        :return: tuple (owner, ids) with one entry per segment found in any of the cells
+        """
+        low, shape, offsets, ids = self._compressed()
+        kx, ky = ix - low[0], iy - low[1]
+        inside = (kx >= 0) & (kx < shape[0]) & (ky >= 0) & (ky < shape[1])
+        owner = owner[inside]
+        start = offsets[(kx * shape[1] + ky)[inside]]
+        counts = offsets[(kx * shape[1] + ky)[inside] + 1] - start
+        position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - start, counts)
+        return np.repeat(owner, counts), ids[position]
+
+    def _compressed(self):
+        """
+        Cells as one dense block from lowest to highest occupied cell in compressed sparse row form: segment indices
+        of cell k = (ix - low_x) * n_y + (iy - low_y) are ids[offsets[k]:offsets[k + 1]]. Rebuilt after changes only.
+
+        :return: tuple (low, shape, offsets, ids)
+        """
+        if self._compressed_cells is not None and self._compressed_cells[0] == self.revision:
+            return self._compressed_cells[1]
+        if self.cells:
+            keys = np.array(list(self.cells.keys()), dtype=np.int64)
+            counts = np.array([len(ids) for ids in self.cells.values()], dtype=np.int64)
+            low = keys.min(axis=0)
+            shape = keys.max(axis=0) - low + 1
+            dense = (keys[:, 0] - low[0]) * shape[1] + keys[:, 1] - low[1]
+            order = np.argsort(dense)
+            offsets = np.zeros(shape[0] * shape[1] + 1, dtype=np.int64)
+            offsets[dense + 1] = counts
+            np.cumsum(offsets, out=offsets)
+            values = list(self.cells.values())
+            ids = np.array([i for k in order.tolist() for i in values[k]], dtype=np.int64)
+        else:
+            low, shape = np.zeros(2, dtype=np.int64), np.zeros(2, dtype=np.int64)
+            offsets, ids = np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        self._compressed_cells = (self.revision, (low, shape, offsets, ids))
+        return self._compressed_cells[1]
+
+    def _cell_of(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _traverse(self, ox, oy, dx, dy, length):
+        """
+        Grid traversal along a ray (digital differential analyzer after Amanatides and Woo)
+
+        :return: list with all cells (ix, iy) the ray passes through
+        """
+        cs = self.cell_size
+        ix, iy = self._cell_of(ox, oy)
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # Ray parameter at next cell boundary and between two boundaries in each direction
+        if dx != 0:
+            t_max_x = ((ix + (dx > 0)) * cs - ox) / dx
+            t_delta_x = cs / abs(dx)
+        else:
+            t_max_x = t_delta_x = math.inf
+        if dy != 0:
+            t_max_y = ((iy + (dy > 0)) * cs - oy) / dy
+            t_delta_y = cs / abs(dy)
+        else:
+            t_max_y = t_delta_y = math.inf
+        cells = [(ix, iy)]
+        while True:
+            if t_max_x < t_max_y:
+                if t_max_x > length:
+                    break
+                ix += step_x
+                t_max_x += t_delta_x
+            else:
+                if t_max_y > length:
+                    break
+                iy += step_y
+                t_max_y += t_delta_y
+            cells.append((ix, iy))
+        return cells
+
+    @staticmethod
+    def _unique(index_lists):
+        if not index_lists:
+            return np.zeros(0, dtype=int)
+        return np.unique(np.concatenate(index_lists))
@@ -0,0 +1,96 @@
+import numpy as np
+
+# Maximum number of circle/segment pairs solved in one broadcast, bigger problems are split into segment chunks
+CHUNK_ELEMENTS = 2 ** 20
+
+
+def swept_circle_segments(p0, p1, radius, segments):
+    """
+    Earliest time of impact of circles moving linearly from p0 to p1 with any segment (continuous collision detection).
+    This is solved as moving center point against the capsule of each segment, that is the segment inflated by radius:
+    two circles around the end points and two lines parallel to the segment.
+
+    :param p0: circle centers at start of step, np.ndarray with shape (2,) or (C, 2)
+    :param p1: circle centers at end of step, same shape as p0
+    :param radius: circle radius
+    :param segments: np.ndarray with shape (N, 4) and rows [x1, y1, x2, y2]
+    :return: tuple (toi, index) with np.ndarrays of shape (C,), toi is fraction of step in [0, 1] at first contact
+        (0 if circle already overlaps at start) or np.inf and index -1 without contact
+    """
+    p0 = np.atleast_2d(np.asarray(p0, dtype=float))
+    p1 = np.atleast_2d(np.asarray(p1, dtype=float))
+    n_circles = len(p0)
+    toi = np.full(n_circles, np.inf)
+    toi_idx = np.full(n_circles, -1)
+    if n_circles == 0 or len(segments) == 0:
+        return toi, toi_idx
+
+    # Circle values as column vectors to broadcast against all segments
+    px, py = p0[:, 0:1], p0[:, 1:2]
+    dx, dy = p1[:, 0:1] - px, p1[:, 1:2] - py
+    d2 = dx * dx + dy * dy
+
+    chunk = max(1, CHUNK_ELEMENTS // n_circles)
+    for start in range(0, len(segments), chunk):
+        t = _swept_toi(px, py, dx, dy, d2, radius, segments[start:start + chunk])
+        idx = np.argmin(t, axis=1)
+        t_min = t[np.arange(n_circles), idx]
+        better = t_min < toi
+        toi[better] = t_min[better]
+        toi_idx[better] = idx[better] + start
+
+    return toi, toi_idx
+
+
+def swept_circle_segment_pairs(p0, p1, radius, segments):
+    """
+    Time of impact of circle i with segment i only, e.g. for candidate pairs found by a SegmentGrid
+
+    :param p0: circle centers at start of step, np.ndarray with shape (P, 2)
+    :param p1: circle centers at end of step, np.ndarray with shape (P, 2)
+    :param radius: circle radius
+    :param segments: np.ndarray with shape (P, 4) and rows [x1, y1, x2, y2]
+    :return: np.ndarray with shape (P,), toi like in swept_circle_segments
+    """
+    px, py = p0[:, 0], p0[:, 1]
+    dx, dy = p1[:, 0] - px, p1[:, 1] - py
+    return _swept_toi(px, py, dx, dy, dx * dx + dy * dy, radius, segments)
+
+
+def _swept_toi(px, py, dx, dy, d2, radius, seg):
+    """
+    Time of impact of moving circles with segments, all circle values broadcast against the segment columns
+
+    :return: toi in [0, 1] or np.inf without contact
+    """
+    r2 = radius * radius
+    ax, ay, bx, by = seg[:, 0], seg[:, 1], seg[:, 2], seg[:, 3]
+    ex, ey = bx - ax, by - ay
+    l2 = ex * ex + ey * ey
+    wx, wy = px - ax, py - ay
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Overlap at start of step
+        along = np.clip(np.where(l2 > 0, (wx * ex + wy * ey) / l2, 0), 0, 1)
+        dist2 = (wx - along * ex) ** 2 + (wy - along * ey) ** 2
+        t = np.where(dist2 <= r2, 0.0, np.inf)
+
+        # Contact with circles around both end points: |w + t * d|^2 = r^2
+        for qx, qy in ((wx, wy), (px - bx, py - by)):
+            half_b = qx * dx + qy * dy
+            c = qx * qx + qy * qy - r2
+            disc = half_b * half_b - d2 * c
+            t_end = (-half_b - np.sqrt(disc)) / d2
+            valid = (disc >= 0) & (d2 > 0) & (t_end >= 0) & (t_end <= 1)
+            t = np.minimum(t, np.where(valid, t_end, np.inf))
+
+        # Contact with lines parallel to segment on the side the circle comes from
+        length = np.sqrt(l2)
+        nx, ny = -ey / length, ex / length
+        s0 = wx * nx + wy * ny
+        ds = dx * nx + dy * ny
+        t_side = (np.sign(s0) * radius - s0) / ds
+        along_side = ((wx + t_side * dx) * ex + (wy + t_side * dy) * ey) / l2
+        valid = (l2 > 0) & (ds != 0) & (t_side >= 0) & (t_side <= 1) & (along_side >= 0) & (along_side <= 1)
+        t = np.minimum(t, np.where(valid, t_side, np.inf))
+    return t